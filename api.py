@@ -6,7 +6,8 @@ import sys
 from pathlib import Path
 import json
 import logging
-from typing import List, Optional
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import weakref
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -21,7 +22,7 @@ from src.api_models import (
     ResultsResponse, ErrorResponse, HealthResponse
 )
 from src.api_job_manager import get_job_manager
-from src.risk_predictor import RiskPredictor
+from src.risk_predictor import RiskPredictor, get_risk_predictor
 
 # Configure logging
 logging.basicConfig(
@@ -48,15 +49,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize risk predictor (cached)
-_predictor = None
-
 def get_predictor() -> RiskPredictor:
-    """Get or create risk predictor instance"""
-    global _predictor
-    if _predictor is None:
-        _predictor = RiskPredictor()
-    return _predictor
+    """Get the shared risk predictor instance"""
+    return get_risk_predictor()
+
+# Route (path, methods) metadata for introspection. Entries are filled on
+# first lookup, once the app's routes are registered, and are never
+# refreshed; each is dropped when its route object is collected. Keyed by
+# id() because Starlette routes define __eq__ and so are not hashable.
+_route_meta_cache: Dict[int, Tuple[str, FrozenSet[str]]] = {}
+
+def _meta(route) -> Tuple[str, FrozenSet[str]]:
+    """Return the cached (path, methods) of a route; methods is empty for mounts"""
+    meta = _route_meta_cache.get(id(route))
+    if meta is None:
+        meta = (getattr(route, 'path', ''), frozenset(getattr(route, 'methods', None) or ()))
+        _route_meta_cache[id(route)] = meta
+        weakref.finalize(route, _route_meta_cache.pop, id(route), None)
+    return meta
 
 
 # ============================================================================
@@ -275,13 +285,13 @@ def run_analysis(analysis_id: str, file_path: str, drugs: List[str]):
         predictor = get_predictor()
         
         # Run prediction
-        result = predictor.predict_from_vcf(file_path, drugs)
+        result = predictor.predict_from_vcf(file_path, drugs, as_json=False)
         
         if not result['success']:
             raise Exception(f"Prediction failed: {result.get('errors', 'Unknown error')}")
         
-        # Parse JSON output
-        json_output = json.loads(result['json_output'])
+        # Report entries as built, without re-parsing the JSON string
+        json_output = result['assessments']
         
         # Get cache stats
         cache_stats = None
@@ -8,7 +8,7 @@ import io
 from datetime import datetime
 import base64
 import uuid
-from src.risk_predictor import RiskPredictor
+from src.risk_predictor import get_risk_predictor
 from src.utils import (
     SUPPORTED_DRUGS,
     CRITICAL_GENES,
@@ -207,7 +207,7 @@ def analyze_vcf(uploaded_file, drugs):
         
         # Run prediction
         st.info("🔄 Analyzing VCF file...")
-        predictor = RiskPredictor()
+        predictor = get_risk_predictor()
         results = predictor.predict_from_vcf(temp_path, drugs)
         
         if not results['success']:
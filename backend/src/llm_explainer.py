@@ -1,6 +1,9 @@
 import os
+import re
+import json
+import time
 from dotenv import load_dotenv
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import sys
 from pathlib import Path
 
@@ -13,13 +16,47 @@ from src.llm_prompt_templates import PromptBuilder
 # Load environment variables from .env file
 load_dotenv()
 
+# A batched reply may wrap its JSON array in a Markdown code fence
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def _split_batch_reply(reply: str, count: int) -> List[Optional[str]]:
+    """
+    Split a batched reply into one answer per case, in case order.
+
+    build_batch asks for a JSON array of exactly count strings. Anything
+    else (not JSON, a different length, a non-string or empty element) is
+    rejected whole: every case is None, so callers fall back to per-item
+    requests and nothing from a malformed reply is cached.
+    """
+    rejected: List[Optional[str]] = [None] * count
+    try:
+        answers = json.loads(_CODE_FENCE.sub("", reply.strip()))
+    except ValueError:
+        return rejected
+    if not isinstance(answers, list) or len(answers) != count:
+        return rejected
+    if not all(isinstance(answer, str) and answer.strip() for answer in answers):
+        return rejected
+    return [answer.strip() for answer in answers]
+
+
 class LLMExplainer:
     """
     Integrates with OpenAI or Groq to provide natural language explanations for pharmacogenomic risks.
     Uses pre-built prompt templates and persistent caching for efficiency.
     Automatically detects available API and uses Groq if available, otherwise OpenAI.
     """
-    def __init__(self, api_key: str = None, model: str = None, cache_db: str = "llm_cache.db", provider: str = None):
+    # Completion budget per batched chat request; gpt-3.5-turbo caps
+    # output at 4096 tokens, so larger batches are split across requests
+    BATCH_MAX_TOKENS = 4096
+
+    # Longest wait, in seconds, for an offline Batch API job (whose own
+    # window is 24h) before falling back to per-item requests
+    BATCH_TIMEOUT = 3600.0
+
+    def __init__(self, api_key: str = None, model: str = None, cache_db: str = None, provider: str = None,
+                 cache_only: bool = False):
         # Load environment variables
         groq_key = os.getenv("GROQ_API_KEY")
         openai_key = api_key if api_key else os.getenv("OPENAI_API_KEY")
@@ -35,9 +72,28 @@ class LLMExplainer:
                 raise ValueError("No API key found. Please set GROQ_API_KEY or OPENAI_API_KEY in .env file.")
         
         self.provider = provider.lower()
-        self.cache = ExplanationCache(cache_db)
+        
+        # Cache settings: PHARMAGUARD_CACHE_BACKEND is "sqlite" (on disk,
+        # shared across runs) or "memory" (per process), and an explicit
+        # cache_db overrides it; TTL in days and in-memory entry count
+        if cache_db is None:
+            backend = os.getenv("PHARMAGUARD_CACHE_BACKEND", "sqlite").lower()
+            if backend not in ("sqlite", "memory"):
+                raise ValueError(f"Unknown cache backend: {backend}. Use 'sqlite' or 'memory'.")
+            cache_db = ":memory:" if backend == "memory" else "llm_cache.db"
+        ttl_days = int(os.getenv("PHARMAGUARD_CACHE_TTL_DAYS", "365"))
+        if ttl_days < 0:
+            raise ValueError("PHARMAGUARD_CACHE_TTL_DAYS must be non-negative")
+        memory_size = int(os.getenv("PHARMAGUARD_CACHE_MAX_ENTRIES", str(ExplanationCache.MEMORY_SIZE)))
+        if memory_size <= 0:
+            raise ValueError("PHARMAGUARD_CACHE_MAX_ENTRIES must be positive")
+        self.cache = ExplanationCache(cache_db, ttl_days=ttl_days, memory_size=memory_size)
         self.prompt_builder = PromptBuilder()
         
+        # Cache-only mode (or PHARMAGUARD_CACHE_ONLY=1) serves cached
+        # explanations and makes no requests; misses get the error/fallback text
+        self.cache_only = cache_only or os.getenv("PHARMAGUARD_CACHE_ONLY") == "1"
+        
         # Initialize appropriate client
         if self.provider == "groq":
             try:
@@ -60,6 +116,285 @@ class LLMExplainer:
         else:
             raise ValueError(f"Unknown provider: {provider}. Use 'openai' or 'groq'.")
 
+    def _chat(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        """Send one prompt to the configured provider and return the reply text."""
+        if self.cache_only:
+            raise RuntimeError("LLM requests are disabled in cache-only mode")
+        messages = [
+            {"role": "system", "content": self.prompt_builder.get_system_role()},
+            {"role": "user", "content": prompt}
+        ]
+        if self.provider == "groq":
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        else:  # OpenAI
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=1,
+                frequency_penalty=0,
+                presence_penalty=0
+            )
+        return response.choices[0].message.content.strip()
+
+    def _chat_batch(self, prompts: List[str], temperature: float, max_tokens: int) -> List[Optional[str]]:
+        """
+        Answer several prompts with as few requests as BATCH_MAX_TOKENS allows.
+
+        Returns one answer per prompt, in order; None where the reply had no
+        usable answer for that case. A failed request only loses its own
+        chunk, so answers already paid for are still returned.
+        """
+        per_request = max(1, self.BATCH_MAX_TOKENS // max_tokens)
+        answers: List[Optional[str]] = []
+        for start in range(0, len(prompts), per_request):
+            chunk = prompts[start:start + per_request]
+            try:
+                reply = self._chat(
+                    self.prompt_builder.build_batch(chunk),
+                    temperature=temperature,
+                    max_tokens=max_tokens * len(chunk)
+                )
+            except Exception:
+                answers += [None] * len(chunk)
+                continue
+            answers += _split_batch_reply(reply, len(chunk))
+        return answers
+
+    def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """
+        Queue chat requests on the OpenAI Batch API for offline processing.
+
+        Args:
+            requests: Dicts with custom_id, prompt, temperature and max_tokens
+
+        Returns:
+            Batch job id, to be passed to poll_batch
+        """
+        if self.cache_only:
+            raise RuntimeError("LLM requests are disabled in cache-only mode")
+        if self.provider != "openai":
+            raise ValueError("The Batch API is only supported with the OpenAI provider")
+
+        lines = []
+        for request in requests:
+            lines.append(json.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": self.prompt_builder.get_system_role()},
+                        {"role": "user", "content": request["prompt"]}
+                    ],
+                    "temperature": request["temperature"],
+                    "max_tokens": request["max_tokens"],
+                },
+            }))
+
+        batch_file = self.client.files.create(
+            file=("pharmaguard_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def poll_batch(self, batch_id: str, poll_interval: float = 30.0,
+                   timeout: Optional[float] = None) -> Dict[str, str]:
+        """
+        Wait for a Batch API job and collect its replies.
+
+        Args:
+            batch_id: Id returned by submit_batch
+            poll_interval: Seconds between status checks
+            timeout: Seconds to wait before giving up (None = until the job ends)
+
+        Returns:
+            Reply text by custom_id; failed requests are omitted
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status == "completed":
+                break
+            if batch.status in ("failed", "expired", "cancelling", "cancelled"):
+                raise RuntimeError(f"Batch {batch_id} ended with status '{batch.status}'")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Batch {batch_id} still '{batch.status}' after {timeout}s")
+            time.sleep(poll_interval)
+
+        replies = {}
+        if not batch.output_file_id:
+            return replies
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                message = response["body"]["choices"][0]["message"]["content"]
+                replies[record["custom_id"]] = message.strip()
+        return replies
+
+    def _batch_api_answers(self, prompts: List[str], temperature: float, max_tokens: int) -> List[Optional[str]]:
+        """
+        Answer prompts through one Batch API job; same contract as _chat_batch.
+
+        Waits at most BATCH_TIMEOUT; a job still running then is cancelled
+        and the TimeoutError propagates, so callers fall back to per-item
+        requests.
+        """
+        batch_id = self.submit_batch([
+            {"custom_id": str(i), "prompt": prompt, "temperature": temperature, "max_tokens": max_tokens}
+            for i, prompt in enumerate(prompts)
+        ])
+        try:
+            replies = self.poll_batch(batch_id, timeout=self.BATCH_TIMEOUT)
+        except TimeoutError:
+            self.client.batches.cancel(batch_id)
+            raise
+        return [replies.get(str(i)) for i in range(len(prompts))]
+
+    def _explain_batch(self, cases: List[Dict[str, Any]], lookup, store_many, build_prompt,
+                       explain_one, temperature: float, max_tokens: int,
+                       offline: bool = False) -> List[Dict[str, Any]]:
+        """
+        Shared driver for the batched explanation methods.
+
+        Cached cases are answered from the cache; the remaining distinct cases
+        go to the LLM in one batched chat request (split only past
+        BATCH_MAX_TOKENS), or in one Batch API job when offline,
+        and their answers are cached together through store_many. Cases the
+        reply did not answer (all of them if it was malformed or the request
+        failed) fall back to explain_one.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(cases)
+        pending: Dict[tuple, List[int]] = {}
+        for i, case in enumerate(cases):
+            cached = lookup(case)
+            if cached:
+                results[i] = {"summary": cached, "status": "success", "from_cache": True}
+            else:
+                pending.setdefault(tuple(sorted(case.items())), []).append(i)
+
+        if len(pending) > 1 or (offline and pending):
+            uncached = [cases[indices[0]] for indices in pending.values()]
+            answer_all = self._batch_api_answers if offline else self._chat_batch
+            try:
+                answers = answer_all([build_prompt(case) for case in uncached], temperature, max_tokens)
+            except Exception:
+                answers = [None] * len(uncached)
+            answered = []
+            for case, answer, indices in zip(uncached, answers, pending.values()):
+                if answer is None:
+                    continue
+                answered.append((case, answer))
+                for i in indices:
+                    results[i] = {"summary": answer, "status": "success", "from_cache": False}
+            if answered:
+                store_many(answered)
+
+        # Single uncached cases and anything the batch did not answer
+        for indices in pending.values():
+            if results[indices[0]] is None:
+                result = explain_one(cases[indices[0]])
+                for i in indices:
+                    results[i] = result
+        return results
+
+    def get_variant_explanations_batch(self, cases: List[Dict[str, Any]],
+                                     offline: bool = False) -> List[Dict[str, str]]:
+        """
+        Variant explanations for several cases in one batched LLM request.
+
+        Args:
+            cases: Dicts of get_variant_explanation keyword arguments
+                   (gene, diplotype, phenotype, activity_score)
+            offline: Use the Batch API (OpenAI only; waits for the job)
+
+        Returns:
+            One get_variant_explanation-style result per case, in order
+        """
+        return self._explain_batch(
+            cases,
+            lookup=lambda c: self.cache.get_variant_explanation(**c),
+            store_many=lambda answered: self.cache.cache_variant_explanations_bulk([
+                (c["gene"], c["diplotype"], c["phenotype"], c["activity_score"], text)
+                for c, text in answered
+            ]),
+            build_prompt=lambda c: self.prompt_builder.build_variant_explanation(**c),
+            explain_one=lambda c: self.get_variant_explanation(**c),
+            temperature=0.6,
+            max_tokens=180,
+            offline=offline
+        )
+
+    def get_risk_explanations_batch(self, cases: List[Dict[str, Any]],
+                                     offline: bool = False) -> List[Dict[str, str]]:
+        """
+        Risk explanations for several cases in one batched LLM request.
+
+        Args:
+            cases: Dicts of get_risk_explanation keyword arguments
+                   (drug, gene, phenotype, risk_level, clinical_guidance)
+            offline: Use the Batch API (OpenAI only; waits for the job)
+
+        Returns:
+            One get_risk_explanation-style result per case, in order
+        """
+        def cache_key(c):
+            return {k: c[k] for k in ("drug", "gene", "phenotype", "risk_level")}
+
+        return self._explain_batch(
+            cases,
+            lookup=lambda c: self.cache.get_risk_explanation(**cache_key(c)),
+            store_many=lambda answered: self.cache.cache_risk_explanations_bulk([
+                (c["drug"], c["gene"], c["phenotype"], c["risk_level"], text)
+                for c, text in answered
+            ]),
+            build_prompt=lambda c: self.prompt_builder.build_risk_explanation(**c),
+            explain_one=lambda c: self.get_risk_explanation(**c),
+            temperature=0.6,
+            max_tokens=250,
+            offline=offline
+        )
+
+    def get_dosing_adjustments_batch(self, cases: List[Dict[str, Any]],
+                                     offline: bool = False) -> List[Dict[str, str]]:
+        """
+        Dosing adjustments for several cases in one batched LLM request.
+
+        Args:
+            cases: Dicts of get_dosing_adjustment keyword arguments
+                   (drug, phenotype, gene, standard_dose, risk_level)
+            offline: Use the Batch API (OpenAI only; waits for the job)
+
+        Returns:
+            One get_dosing_adjustment-style result per case, in order
+        """
+        # Dosing guidance is not cached, so every case is pending
+        return self._explain_batch(
+            cases,
+            lookup=lambda c: None,
+            store_many=lambda answered: None,
+            build_prompt=lambda c: self.prompt_builder.build_dosing_adjustment(**c),
+            explain_one=lambda c: self.get_dosing_adjustment(**c),
+            temperature=0.5,
+            max_tokens=220,
+            offline=offline
+        )
+
     def get_risk_explanation(self, drug: str, gene: str, phenotype: str, risk_level: str, clinical_guidance: str) -> Dict[str, str]:
         """
         Generates a natural language explanation for a drug-gene-phenotype risk.
@@ -84,31 +419,7 @@ class LLMExplainer:
         prompt = self.prompt_builder.build_risk_explanation(drug, gene, phenotype, risk_level, clinical_guidance)
         
         try:
-            if self.provider == "groq":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.6,
-                    max_tokens=250
-                )
-            else:  # OpenAI
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.6,
-                    max_tokens=250,
-                    top_p=1,
-                    frequency_penalty=0,
-                    presence_penalty=0
-                )
-            
-            explanation = response.choices[0].message.content.strip()
+            explanation = self._chat(prompt, temperature=0.6, max_tokens=250)
             
             # Cache the result
             self.cache.cache_risk_explanation(drug, gene, phenotype, risk_level, explanation)
@@ -141,30 +452,7 @@ class LLMExplainer:
         prompt = self.prompt_builder.build_variant_explanation(gene, diplotype, phenotype, activity_score)
 
         try:
-            if self.provider == "groq":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.6,
-                    max_tokens=180
-                )
-            else:  # OpenAI
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.6,
-                    max_tokens=180,
-                    top_p=1,
-                    frequency_penalty=0,
-                    presence_penalty=0
-                )
-            explanation = response.choices[0].message.content.strip()
+            explanation = self._chat(prompt, temperature=0.6, max_tokens=180)
             
             # Cache the result
             self.cache.cache_variant_explanation(gene, diplotype, phenotype, activity_score, explanation)
@@ -191,30 +479,7 @@ class LLMExplainer:
         prompt = self.prompt_builder.build_dosing_adjustment(drug, phenotype, gene, standard_dose, risk_level)
         
         try:
-            if self.provider == "groq":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.5,
-                    max_tokens=220
-                )
-            else:  # OpenAI
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.5,
-                    max_tokens=220,
-                    top_p=1,
-                    frequency_penalty=0,
-                    presence_penalty=0
-                )
-            explanation = response.choices[0].message.content.strip()
+            explanation = self._chat(prompt, temperature=0.5, max_tokens=220)
             return {"summary": explanation, "status": "success"}
         except Exception as e:
             return {"summary": f"Could not generate dosing adjustment: {e}", "status": "error"}
@@ -236,30 +501,7 @@ class LLMExplainer:
         prompt = self.prompt_builder.build_drug_summary(drug, genes, phenotypes, overall_risk)
         
         try:
-            if self.provider == "groq":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.6,
-                    max_tokens=250
-                )
-            else:  # OpenAI
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.6,
-                    max_tokens=250,
-                    top_p=1,
-                    frequency_penalty=0,
-                    presence_penalty=0
-                )
-            explanation = response.choices[0].message.content.strip()
+            explanation = self._chat(prompt, temperature=0.6, max_tokens=250)
             return {"summary": explanation, "status": "success"}
         except Exception as e:
             return {"summary": f"Could not generate drug summary: {e}", "status": "error"}
@@ -280,30 +522,7 @@ class LLMExplainer:
         prompt = self.prompt_builder.build_phenotype_interpretation(gene, phenotype, activity_score)
         
         try:
-            if self.provider == "groq":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.5,
-                    max_tokens=160
-                )
-            else:  # OpenAI
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.prompt_builder.get_system_role()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.5,
-                    max_tokens=160,
-                    top_p=1,
-                    frequency_penalty=0,
-                    presence_penalty=0
-                )
-            explanation = response.choices[0].message.content.strip()
+            explanation = self._chat(prompt, temperature=0.5, max_tokens=160)
             return {"summary": explanation, "status": "success"}
         except Exception as e:
             return {"summary": f"Could not generate phenotype interpretation: {e}", "status": "error"}
@@ -0,0 +1,37 @@
+"""
+Shared pytest fixtures for PharmaGuard test modules
+Heavy objects are built once per test session and reused by every test
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+@pytest.fixture(scope="session")
+def predictor():
+    """Single RiskPredictor (and LLM client) shared across the session"""
+    from src.risk_predictor import get_risk_predictor
+    return get_risk_predictor()
+
+
+@pytest.fixture(scope="session")
+def llm(predictor):
+    """LLM explainer owned by the shared predictor
+
+    Tests that take this fixture need a live provider, so they are skipped
+    when no LLM API key is configured.
+    """
+    if predictor.llm_explainer is None:
+        pytest.skip("no LLM API key configured")
+    return predictor.llm_explainer
+
+
+@pytest.fixture(scope="session")
+def client():
+    """In-process TestClient for the REST API, built once per session"""
+    from fastapi.testclient import TestClient
+    from api import app
+    return TestClient(app)
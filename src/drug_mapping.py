@@ -2,6 +2,7 @@
 Drug-gene-phenotype mapping based on CPIC guidelines
 Maps gene phenotypes to drug risk levels
 """
+from functools import lru_cache
 from typing import Dict, List, Tuple
 from src.gene_models import RiskLevel, Phenotype
 from src.cpic_dosing_rules import get_cpic_dosing, CPIC_PHLEBOTOMY_RULES
@@ -211,6 +212,26 @@ def get_drug_recommendations(
     Get comprehensive drug recommendations using CPIC dosing database
     Returns: {risk_level, explanation, dosing_recommendation, monitoring, cpic_level, strength}
     """
+    try:
+        phenotype_items = frozenset(phenotypes.items())
+    except TypeError:
+        # Unhashable phenotype values cannot be memoized
+        return _build_drug_recommendations(drug_name, phenotypes)
+    # Copy so callers cannot mutate the memoized result
+    return dict(_get_drug_recommendations_cached(drug_name, phenotype_items))
+
+
+@lru_cache(maxsize=1024)
+def _get_drug_recommendations_cached(drug_name: str, phenotype_items: frozenset) -> Dict:
+    """Memoized recommendations keyed on drug name and frozen phenotypes"""
+    return _build_drug_recommendations(drug_name, dict(phenotype_items))
+
+
+def _build_drug_recommendations(
+    drug_name: str,
+    phenotypes: Dict[str, Phenotype]
+) -> Dict:
+    """Build drug recommendations from the gene mapper and CPIC rules"""
     mapper = DrugGeneMapper()
     
     # Normalize drug name
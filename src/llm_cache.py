@@ -3,27 +3,157 @@ Database-backed cache for LLM explanations
 Provides persistent caching to avoid redundant API calls
 """
 import json
+import atexit
 import sqlite3
 import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 
 
+# Lookup fields per table, in the order the normalisers below return them
+_KEY_FIELDS = {
+    "variant_explanations": ("gene", "diplotype", "phenotype", "activity_score"),
+    "risk_explanations": ("drug", "gene", "phenotype", "risk_level"),
+    "clinical_guidance": ("drug", "gene", "phenotype"),
+}
+
+
+# The same few gene/drug/phenotype combinations are looked up over and over,
+# so normalising them and hashing the result is memoized
+@lru_cache(maxsize=4096)
+def _variant_key(gene: str, diplotype: str, phenotype: str, activity_score: float) -> tuple:
+    """Normalised lookup values for a variant explanation.
+
+    Activity scores are binned to the CPIC quarter grid, so computed scores
+    such as 1.9999999 or 0.2500001 share an entry with 2.0 or 0.25. A bin is
+    stored as its grid value, which equals the round(score, 2) used by
+    earlier cache keys, so rows written for grid scores still hit.
+    """
+    return (gene.upper(), diplotype.upper(), phenotype.lower(), int(round(activity_score * 4)) / 4)
+
+
+@lru_cache(maxsize=4096)
+def _risk_key(drug: str, gene: str, phenotype: str, risk_level: str) -> tuple:
+    """Normalised lookup values for a risk explanation."""
+    return (drug.lower(), gene.upper(), phenotype.lower(), risk_level.lower())
+
+
+@lru_cache(maxsize=4096)
+def _guidance_key(drug: str, gene: str, phenotype: str) -> tuple:
+    """Normalised lookup values for clinical guidance."""
+    return (drug.lower(), gene.upper(), phenotype.lower())
+
+
+@lru_cache(maxsize=4096)
+def _sql_key(table: str, values: tuple) -> str:
+    """Hash key stored in the table's cache_key column."""
+    key_str = json.dumps(dict(zip(_KEY_FIELDS[table], values)), sort_keys=True)
+    return hashlib.sha256(key_str.encode()).hexdigest()[:16]
+
+
+# Caches not yet closed. Held weakly so the exit hook below does not keep
+# every cache and its SQLite connection alive for the whole process
+_open_caches: "weakref.WeakSet[ExplanationCache]" = weakref.WeakSet()
+
+
+@atexit.register
+def flush_open_caches():
+    """Best-effort flush of every open cache; runs at interpreter exit.
+
+    Call it directly before a hard exit (os._exit), which skips atexit.
+    """
+    for cache in list(_open_caches):
+        try:
+            cache.flush()
+        except sqlite3.Error:
+            pass  # the cache is disposable
+
+
 class ExplanationCache:
     """
     SQLite-based persistent cache for LLM explanations.
     Caches variant and drug risk explanations to reduce API calls.
+
+    Lookups are served from an in-memory LRU in front of SQLite. Writes go
+    to the LRU immediately and are committed to SQLite in batches; call
+    flush() to persist pending writes (done automatically at exit).
+
+    The write-behind buffer trades durability for fewer commits: up to
+    FLUSH_EVERY - 1 entries exist only in memory, and are lost on a hard
+    kill, on os._exit without flush_open_caches(), or if the cache is
+    garbage-collected without close(). Losing them only costs repeat LLM
+    requests.
+
+    One SQLite connection is held for the life of the cache and shared
+    between threads under a lock; call close() when finished with it.
     """
-    
-    def __init__(self, db_path: str = "llm_cache.db"):
-        """Initialize the cache database."""
+
+    # Default entries kept in memory, and writes buffered per SQLite commit
+    MEMORY_SIZE = 4096
+    FLUSH_EVERY = 32
+
+    _INSERT_SQL = {
+        "variant_explanations": '''
+            INSERT OR REPLACE INTO variant_explanations
+            (cache_key, gene, diplotype, phenotype, activity_score, explanation, created_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?)
+        ''',
+        "risk_explanations": '''
+            INSERT OR REPLACE INTO risk_explanations
+            (cache_key, drug, gene, phenotype, risk_level, explanation, created_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?)
+        ''',
+        "clinical_guidance": '''
+            INSERT OR REPLACE INTO clinical_guidance
+            (cache_key, drug, gene, phenotype, guidance, created_at)
+            VALUES (?, ?, ?, ?, ?, datetime('now'))
+        ''',
+    }
+
+    # Applied to every connection: WAL lets a commit append to the log
+    # instead of rewriting a rollback journal, and with synchronous=NORMAL
+    # it only syncs at checkpoints. Temp tables/indices stay in RAM and the
+    # page cache is ~64 MB (a negative cache_size is in KiB).
+    _PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-64000",
+    )
+
+    def __init__(self, db_path: str = "llm_cache.db", ttl_days: int = 365,
+                 memory_size: int = MEMORY_SIZE):
+        """Initialize the cache database.
+
+        Pass ":memory:" for a throwaway cache that never touches disk.
+        ttl_days is the default lifetime of new variant and risk entries;
+        memory_size bounds the in-memory LRU.
+        """
         self.db_path = db_path
+        self.ttl_days = ttl_days
+        self.memory_size = memory_size
+        # (table, *normalised lookup values) -> (text, expires_at or None),
+        # least recently used first
+        self._memory: "OrderedDict[tuple, Tuple[str, Optional[datetime]]]" = OrderedDict()
+        self._pending: Dict[str, List[tuple]] = {table: [] for table in self._INSERT_SQL}
+        self._pending_count = 0
+        # Explanations are requested from several threads at once; the lock
+        # also serialises use of the shared connection
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        for pragma in self._PRAGMAS:
+            self._conn.execute(pragma)
         self._init_db()
+        _open_caches.add(self)
     
     def _init_db(self):
         """Create cache tables if they don't exist."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS variant_explanations (
                     cache_key TEXT PRIMARY KEY,
@@ -58,133 +188,198 @@ class ExplanationCache:
                     created_at TIMESTAMP
                 )
             ''')
-            conn.commit()
+            # Lookups go through the cache_key primary key; expiry sweeps and
+            # stats filter on expires_at
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_variant_expires ON variant_explanations(expires_at)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_risk_expires ON risk_explanations(expires_at)'
+            )
     
-    def _generate_cache_key(self, data: Dict[str, Any]) -> str:
-        """Generate a hash key for cache lookup."""
-        key_str = json.dumps(data, sort_keys=True)
-        return hashlib.sha256(key_str.encode()).hexdigest()[:16]
+    def _lookup(self, table: str, values: tuple, query: str) -> Optional[str]:
+        """Return a cached value from memory, falling back to SQLite.
+
+        values are the normalised lookup values from one of the _*_key
+        helpers; they key the in-memory LRU directly.
+        """
+        key = (table,) + values
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > datetime.utcnow():
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+
+        with self._lock:
+            result = self._conn.execute(query, (_sql_key(table, values),)).fetchone()
+
+        if not result:
+            return None
+        # Rows loaded from SQLite were unexpired just now; TTLs are measured
+        # in days, so they are kept for the life of this cache
+        self._remember(key, result[0], None)
+        return result[0]
+
+    def _remember(self, key: tuple, value: str, expires_at: Optional[datetime]):
+        """Insert into the in-memory LRU, evicting the oldest entry if full."""
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _store(self, table: str, values: tuple, row: tuple,
+               value: str, expires_at: Optional[datetime] = None):
+        """Cache a value in memory now and queue its SQLite write.
+
+        row holds the table's columns after cache_key.
+        """
+        with self._lock:
+            self._queue(table, values, row, value, expires_at)
+            if self._pending_count >= self.FLUSH_EVERY:
+                self.flush()
+
+    def _queue(self, table: str, values: tuple, row: tuple,
+               value: str, expires_at: Optional[datetime] = None):
+        """Cache a value in memory and queue its SQLite write without flushing."""
+        self._remember((table,) + values, value, expires_at)
+        with self._lock:
+            self._pending[table].append((_sql_key(table, values),) + row)
+            self._pending_count += 1
+
+    def flush(self):
+        """Write all pending cache entries to SQLite in one transaction."""
+        with self._lock:
+            if not self._pending_count:
+                return
+            with self._conn as conn:
+                for table, rows in self._pending.items():
+                    if rows:
+                        conn.executemany(self._INSERT_SQL[table], rows)
+            for rows in self._pending.values():
+                rows.clear()
+            self._pending_count = 0
+
+    def close(self):
+        """Flush pending writes and close the SQLite connection."""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+        _open_caches.discard(self)
     
+    def _expiry(self, ttl_days: Optional[int]) -> datetime:
+        """Expiry time for an entry written now; None means the cache default."""
+        return datetime.utcnow() + timedelta(days=self.ttl_days if ttl_days is None else ttl_days)
+
     def get_variant_explanation(self, gene: str, diplotype: str, phenotype: str, activity_score: float) -> Optional[str]:
         """Retrieve cached variant explanation."""
-        cache_data = {
-            "gene": gene.upper(),
-            "diplotype": diplotype.upper(),
-            "phenotype": phenotype.lower(),
-            "activity_score": round(activity_score, 2)
-        }
-        cache_key = self._generate_cache_key(cache_data)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute('''
-                SELECT explanation FROM variant_explanations
-                WHERE cache_key = ? AND (expires_at IS NULL OR expires_at > datetime('now'))
-            ''', (cache_key,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+        values = _variant_key(gene, diplotype, phenotype, activity_score)
+        return self._lookup("variant_explanations", values, '''
+            SELECT explanation FROM variant_explanations
+            WHERE cache_key = ? AND (expires_at IS NULL OR expires_at > datetime('now'))
+        ''')
     
     def cache_variant_explanation(self, gene: str, diplotype: str, phenotype: str, 
-                                 activity_score: float, explanation: str, ttl_days: int = 365):
+                                 activity_score: float, explanation: str, ttl_days: Optional[int] = None):
         """Cache a variant explanation."""
-        cache_data = {
-            "gene": gene.upper(),
-            "diplotype": diplotype.upper(),
-            "phenotype": phenotype.lower(),
-            "activity_score": round(activity_score, 2)
-        }
-        cache_key = self._generate_cache_key(cache_data)
-        expires_at = datetime.utcnow() + timedelta(days=ttl_days)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                INSERT OR REPLACE INTO variant_explanations
-                (cache_key, gene, diplotype, phenotype, activity_score, explanation, created_at, expires_at)
-                VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?)
-            ''', (cache_key, gene, diplotype, phenotype, activity_score, explanation, expires_at))
-            conn.commit()
+        values = _variant_key(gene, diplotype, phenotype, activity_score)
+        expires_at = self._expiry(ttl_days)
+
+        self._store(
+            "variant_explanations", values,
+            (gene, diplotype, phenotype, activity_score, explanation, expires_at),
+            explanation, expires_at
+        )
+    
+    def cache_variant_explanations_bulk(self, rows: List[tuple], ttl_days: Optional[int] = None):
+        """Cache many variant explanations and commit them in one transaction.
+
+        Each row is (gene, diplotype, phenotype, activity_score, explanation).
+        """
+        expires_at = self._expiry(ttl_days)
+        with self._lock:
+            for gene, diplotype, phenotype, activity_score, explanation in rows:
+                self._queue(
+                    "variant_explanations",
+                    _variant_key(gene, diplotype, phenotype, activity_score),
+                    (gene, diplotype, phenotype, activity_score, explanation, expires_at),
+                    explanation, expires_at
+                )
+            self.flush()
     
     def get_risk_explanation(self, drug: str, gene: str, phenotype: str, risk_level: str) -> Optional[str]:
         """Retrieve cached risk explanation."""
-        cache_data = {
-            "drug": drug.lower(),
-            "gene": gene.upper(),
-            "phenotype": phenotype.lower(),
-            "risk_level": risk_level.lower()
-        }
-        cache_key = self._generate_cache_key(cache_data)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute('''
-                SELECT explanation FROM risk_explanations
-                WHERE cache_key = ? AND (expires_at IS NULL OR expires_at > datetime('now'))
-            ''', (cache_key,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+        values = _risk_key(drug, gene, phenotype, risk_level)
+        return self._lookup("risk_explanations", values, '''
+            SELECT explanation FROM risk_explanations
+            WHERE cache_key = ? AND (expires_at IS NULL OR expires_at > datetime('now'))
+        ''')
     
     def cache_risk_explanation(self, drug: str, gene: str, phenotype: str, 
-                              risk_level: str, explanation: str, ttl_days: int = 365):
+                              risk_level: str, explanation: str, ttl_days: Optional[int] = None):
         """Cache a risk explanation."""
-        cache_data = {
-            "drug": drug.lower(),
-            "gene": gene.upper(),
-            "phenotype": phenotype.lower(),
-            "risk_level": risk_level.lower()
-        }
-        cache_key = self._generate_cache_key(cache_data)
-        expires_at = datetime.utcnow() + timedelta(days=ttl_days)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                INSERT OR REPLACE INTO risk_explanations
-                (cache_key, drug, gene, phenotype, risk_level, explanation, created_at, expires_at)
-                VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?)
-            ''', (cache_key, drug, gene, phenotype, risk_level, explanation, expires_at))
-            conn.commit()
+        values = _risk_key(drug, gene, phenotype, risk_level)
+        expires_at = self._expiry(ttl_days)
+
+        self._store(
+            "risk_explanations", values,
+            (drug, gene, phenotype, risk_level, explanation, expires_at),
+            explanation, expires_at
+        )
+    
+    def cache_risk_explanations_bulk(self, rows: List[tuple], ttl_days: Optional[int] = None):
+        """Cache many risk explanations and commit them in one transaction.
+
+        Each row is (drug, gene, phenotype, risk_level, explanation).
+        """
+        expires_at = self._expiry(ttl_days)
+        with self._lock:
+            for drug, gene, phenotype, risk_level, explanation in rows:
+                self._queue(
+                    "risk_explanations",
+                    _risk_key(drug, gene, phenotype, risk_level),
+                    (drug, gene, phenotype, risk_level, explanation, expires_at),
+                    explanation, expires_at
+                )
+            self.flush()
     
     def get_clinical_guidance(self, drug: str, gene: str, phenotype: str) -> Optional[str]:
         """Retrieve cached clinical guidance."""
-        cache_data = {
-            "drug": drug.lower(),
-            "gene": gene.upper(),
-            "phenotype": phenotype.lower()
-        }
-        cache_key = self._generate_cache_key(cache_data)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute('''
-                SELECT guidance FROM clinical_guidance
-                WHERE cache_key = ?
-            ''', (cache_key,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+        values = _guidance_key(drug, gene, phenotype)
+        return self._lookup("clinical_guidance", values, '''
+            SELECT guidance FROM clinical_guidance
+            WHERE cache_key = ?
+        ''')
     
     def cache_clinical_guidance(self, drug: str, gene: str, phenotype: str, guidance: str):
         """Cache clinical guidance."""
-        cache_data = {
-            "drug": drug.lower(),
-            "gene": gene.upper(),
-            "phenotype": phenotype.lower()
-        }
-        cache_key = self._generate_cache_key(cache_data)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                INSERT OR REPLACE INTO clinical_guidance
-                (cache_key, drug, gene, phenotype, guidance, created_at)
-                VALUES (?, ?, ?, ?, ?, datetime('now'))
-            ''', (cache_key, drug, gene, phenotype, guidance))
-            conn.commit()
+        values = _guidance_key(drug, gene, phenotype)
+        self._store(
+            "clinical_guidance", values,
+            (drug, gene, phenotype, guidance),
+            guidance
+        )
     
     def clear_expired(self):
         """Remove expired cache entries."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('DELETE FROM variant_explanations WHERE expires_at <= datetime("now")')
-            conn.execute('DELETE FROM risk_explanations WHERE expires_at <= datetime("now")')
-            conn.commit()
+        self.flush()
+        with self._lock:
+            now = datetime.utcnow()
+            for key, (_, expires_at) in list(self._memory.items()):
+                if expires_at is not None and expires_at <= now:
+                    del self._memory[key]
+            with self._conn as conn:
+                conn.execute('DELETE FROM variant_explanations WHERE expires_at <= datetime("now")')
+                conn.execute('DELETE FROM risk_explanations WHERE expires_at <= datetime("now")')
     
     def get_cache_stats(self) -> Dict[str, int]:
         """Get cache statistics."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock:
+            self.flush()
+            conn = self._conn
             variant_count = conn.execute(
                 'SELECT COUNT(*) FROM variant_explanations WHERE expires_at IS NULL OR expires_at > datetime("now")'
             ).fetchone()[0]
@@ -2,12 +2,53 @@
 Comprehensive LLM integration for PharmaGuard
 Provides complete explanation pipeline with caching and templates
 """
+from bisect import bisect_right
 from typing import Dict, List, Optional, Any
 from src.gene_models import Phenotype, RiskLevel
 from src.llm_cache import ExplanationCache
 from src.llm_prompt_templates import PromptBuilder
 
 
+# Lower bounds of each metabolism category above Poor; a score equal to a
+# threshold belongs to the category above it
+_METABOLISM_THRESHOLDS = (0.25, 0.75, 1.5)
+_METABOLISM_LABELS = (
+    "Poor Metabolizer",
+    "Intermediate Metabolizer",
+    "Normal Metabolizer",
+    "Rapid/Ultra-Rapid Metabolizer",
+)
+
+# Clinical recommendations per risk level, filled in with the drug and
+# phenotype for each call
+_CLINICAL_RECOMMENDATIONS = {
+    "TOXIC": (
+        "⚠️ AVOID {drug} - High toxicity risk",
+        "Consider alternative medications for patients with {phenotype} phenotype",
+        "Refer to clinical pharmacist for alternative drug selection",
+        "If {drug} is essential: Start with lowest dose and monitor closely",
+    ),
+    "SAFE": (
+        "✓ {drug} is safe for use",
+        "Standard dosing appropriate for this phenotype",
+        "Continue routine monitoring",
+    ),
+    "ADJUST": (
+        "⚠️ Dose adjustment needed for {drug}",
+        "Phenotype: {phenotype} - Consider dose modification",
+        "Monitor for therapeutic efficacy and adverse effects",
+        "Consider therapeutic drug monitoring",
+    ),
+    "INEFFECTIVE": (
+        "⚠️ {drug} may be ineffective",
+        "High likelihood of treatment failure due to {phenotype}",
+        "Consider alternative medication with better metabolic profile",
+        "Increase dose with caution and close monitoring",
+    ),
+}
+_DEFAULT_RECOMMENDATIONS = ("Consult with pharmacist for personalized guidance",)
+
+
 class PharmaGuardExplainer:
     """
     High-level interface for LLM explanations in PharmaGuard.
@@ -141,33 +182,8 @@ class PharmaGuardExplainer:
         Returns:
             List of recommendations
         """
-        recommendations = {
-            "TOXIC": [
-                f"⚠️ AVOID {drug} - High toxicity risk",
-                f"Consider alternative medications for patients with {phenotype} phenotype",
-                "Refer to clinical pharmacist for alternative drug selection",
-                "If {drug} is essential: Start with lowest dose and monitor closely"
-            ],
-            "SAFE": [
-                f"✓ {drug} is safe for use",
-                "Standard dosing appropriate for this phenotype",
-                "Continue routine monitoring"
-            ],
-            "ADJUST": [
-                f"⚠️ Dose adjustment needed for {drug}",
-                f"Phenotype: {phenotype} - Consider dose modification",
-                "Monitor for therapeutic efficacy and adverse effects",
-                "Consider therapeutic drug monitoring"
-            ],
-            "INEFFECTIVE": [
-                f"⚠️ {drug} may be ineffective",
-                f"High likelihood of treatment failure due to {phenotype}",
-                "Consider alternative medication with better metabolic profile",
-                "Increase dose with caution and close monitoring"
-            ]
-        }
-        
-        return recommendations.get(risk_level.upper(), ["Consult with pharmacist for personalized guidance"])
+        templates = _CLINICAL_RECOMMENDATIONS.get(risk_level.upper(), _DEFAULT_RECOMMENDATIONS)
+        return [template.format(drug=drug, phenotype=phenotype) for template in templates]
     
     def _get_risk_recommendations(self, risk_level: str) -> List[str]:
         """Get general recommendations for a risk level."""
@@ -175,14 +191,7 @@ class PharmaGuardExplainer:
     
     def _categorize_metabolism(self, activity_score: float) -> str:
         """Categorize metabolism based on activity score."""
-        if activity_score >= 1.5:
-            return "Rapid/Ultra-Rapid Metabolizer"
-        elif activity_score >= 0.75:
-            return "Normal Metabolizer"
-        elif activity_score >= 0.25:
-            return "Intermediate Metabolizer"
-        else:
-            return "Poor Metabolizer"
+        return _METABOLISM_LABELS[bisect_right(_METABOLISM_THRESHOLDS, activity_score)]
     
     def _compare_risks(self, risk1: str, risk2: str) -> int:
         """
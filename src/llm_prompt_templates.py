@@ -2,7 +2,8 @@
 Pre-built prompt templates for LLM explanations
 Avoids complex prompt engineering by using standardized, tested templates
 """
-from typing import Dict, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional
 from enum import Enum
 
 
@@ -100,6 +101,66 @@ Keep under 150 words. Use clear terminology.
 }
 
 
+# Bound format methods of the stripped templates, resolved once at import.
+# Every template starts and ends with literal text, so stripping before
+# formatting gives the same prompt as formatting then stripping
+_VARIANT_TEMPLATE = PROMPT_TEMPLATES[PromptTemplate.VARIANT_EXPLANATION.value].strip().format
+_RISK_TEMPLATE = PROMPT_TEMPLATES[PromptTemplate.RISK_EXPLANATION.value].strip().format
+_DOSING_TEMPLATE = PROMPT_TEMPLATES[PromptTemplate.DOSING_ADJUSTMENT.value].strip().format
+_SUMMARY_TEMPLATE = PROMPT_TEMPLATES[PromptTemplate.DRUG_SUMMARY.value].strip().format
+_PHENOTYPE_TEMPLATE = PROMPT_TEMPLATES[PromptTemplate.PHENOTYPE_INTERPRETATION.value].strip().format
+
+
+# Header for several prompts answered in one request; each case is then
+# appended as "[n] <prompt>" and answered under the same marker
+BATCH_PROMPT_HEADER = """
+Answer each of the following {count} cases separately.
+Reply with only a JSON array of exactly {count} strings, where element n is
+the answer to case [n]. Do not repeat the case text. Follow each case's own
+length guidance.
+"""
+
+
+# Reports request the same few gene/phenotype/drug combinations over and
+# over, and prompts are pure functions of their arguments, so the three
+# per-report prompts are memoized
+@lru_cache(maxsize=512)
+def _variant_prompt(gene: str, diplotype: str, phenotype: str, activity_score: float) -> str:
+    """Variant explanation prompt for the given profile."""
+    return _VARIANT_TEMPLATE(
+        gene=gene,
+        diplotype=diplotype,
+        phenotype=phenotype,
+        activity_score=f"{activity_score:.2f}"
+    )
+
+
+@lru_cache(maxsize=512)
+def _risk_prompt(drug: str, gene: str, phenotype: str,
+                 risk_level: str, clinical_guidance: str) -> str:
+    """Risk explanation prompt for the given drug-gene interaction."""
+    return _RISK_TEMPLATE(
+        drug=drug,
+        gene=gene,
+        phenotype=phenotype,
+        risk_level=risk_level,
+        clinical_guidance=clinical_guidance
+    )
+
+
+@lru_cache(maxsize=512)
+def _dosing_prompt(drug: str, phenotype: str, gene: str,
+                   standard_dose: str, risk_level: str) -> str:
+    """Dosing adjustment prompt for the given drug and phenotype."""
+    return _DOSING_TEMPLATE(
+        drug=drug,
+        phenotype=phenotype,
+        gene=gene,
+        standard_dose=standard_dose,
+        risk_level=risk_level
+    )
+
+
 class PromptBuilder:
     """Builder for constructing prompts from templates."""
     
@@ -109,58 +170,42 @@ class PromptBuilder:
     
     def build_variant_explanation(self, gene: str, diplotype: str, phenotype: str, activity_score: float) -> str:
         """Build variant explanation prompt."""
-        template = PROMPT_TEMPLATES[PromptTemplate.VARIANT_EXPLANATION.value]
-        return template.format(
-            gene=gene,
-            diplotype=diplotype,
-            phenotype=phenotype,
-            activity_score=f"{activity_score:.2f}"
-        ).strip()
+        return _variant_prompt(gene, diplotype, phenotype, activity_score)
     
     def build_risk_explanation(self, drug: str, gene: str, phenotype: str, 
                               risk_level: str, clinical_guidance: str) -> str:
         """Build risk explanation prompt."""
-        template = PROMPT_TEMPLATES[PromptTemplate.RISK_EXPLANATION.value]
-        return template.format(
-            drug=drug,
-            gene=gene,
-            phenotype=phenotype,
-            risk_level=risk_level,
-            clinical_guidance=clinical_guidance
-        ).strip()
+        return _risk_prompt(drug, gene, phenotype, risk_level, clinical_guidance)
     
     def build_dosing_adjustment(self, drug: str, phenotype: str, gene: str,
                                standard_dose: str, risk_level: str) -> str:
         """Build dosing adjustment prompt."""
-        template = PROMPT_TEMPLATES[PromptTemplate.DOSING_ADJUSTMENT.value]
-        return template.format(
-            drug=drug,
-            phenotype=phenotype,
-            gene=gene,
-            standard_dose=standard_dose,
-            risk_level=risk_level
-        ).strip()
+        return _dosing_prompt(drug, phenotype, gene, standard_dose, risk_level)
     
     def build_drug_summary(self, drug: str, genes: list, phenotypes: list, 
                           overall_risk: str) -> str:
         """Build drug summary prompt."""
-        template = PROMPT_TEMPLATES[PromptTemplate.DRUG_SUMMARY.value]
-        return template.format(
+        return _SUMMARY_TEMPLATE(
             drug=drug,
             genes=", ".join(genes),
             phenotypes=", ".join(phenotypes),
             overall_risk=overall_risk
-        ).strip()
+        )
     
     def build_phenotype_interpretation(self, gene: str, phenotype: str, 
                                       activity_score: float) -> str:
         """Build phenotype interpretation prompt."""
-        template = PROMPT_TEMPLATES[PromptTemplate.PHENOTYPE_INTERPRETATION.value]
-        return template.format(
+        return _PHENOTYPE_TEMPLATE(
             gene=gene,
             phenotype=phenotype,
             activity_score=f"{activity_score:.2f}"
-        ).strip()
+        )
+    
+    def build_batch(self, prompts: List[str]) -> str:
+        """Combine prompts into one request asking for a JSON array of answers."""
+        header = BATCH_PROMPT_HEADER.format(count=len(prompts)).strip()
+        cases = "\n\n".join(f"[{i}] {prompt}" for i, prompt in enumerate(prompts, 1))
+        return f"{header}\n\n{cases}"
     
     def get_system_role(self) -> str:
         """Get the system role for LLM."""
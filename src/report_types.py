@@ -0,0 +1,93 @@
+"""
+Typed records for the per-drug report entries produced by RiskPredictor
+Field order matches the JSON output; to_dict() gives the plain-dict form
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+class _Record:
+    """Base for report records, converting them to nested plain dicts"""
+    __slots__ = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            result[name] = value.to_dict() if isinstance(value, _Record) else value
+        return result
+
+
+@dataclass(slots=True)
+class RiskAssessment(_Record):
+    """Risk label with its confidence and severity"""
+    risk_label: str
+    confidence_score: float
+    severity: str
+
+
+@dataclass(slots=True)
+class CPICGuidelines(_Record):
+    """CPIC recommendation backing the risk label"""
+    recommendation_level: str
+    strength_of_recommendation: str
+    clinical_guidance: str
+    cpic_evidence: str
+    reference: str
+
+
+@dataclass(slots=True)
+class PGxProfile(_Record):
+    """Primary gene result and every detected variant"""
+    primary_gene: str
+    diplotype: str
+    phenotype: str
+    detected_variants: List[Dict[str, Any]]
+
+
+@dataclass(slots=True)
+class ClinicalRecommendation(_Record):
+    """Summary, dosing and monitoring advice"""
+    summary: str
+    dosing: str
+    monitoring: str
+
+
+@dataclass(slots=True)
+class LLMExplanation(_Record):
+    """LLM-generated (or rule-based fallback) explanation text"""
+    variant_interpretation: str
+    risk_explanation: str
+    clinical_impact: str
+    dosing_recommendation: str
+    monitoring_guidance: str
+    source: str
+
+
+@dataclass(slots=True)
+class QualityMetrics(_Record):
+    """How the entry was produced"""
+    vcf_parsing_success: bool
+    genes_analyzed: List[str]
+    variant_count: int
+    data_completeness: str
+    algorithm_version: str
+    llm_used: bool
+    llm_provider: Optional[str]
+    llm_model: Optional[str]
+    llm_cached: bool
+    explanation_quality: str
+
+
+@dataclass(slots=True)
+class DrugAssessment(_Record):
+    """One drug's entry in the report"""
+    patient_id: str
+    drug: str
+    timestamp: str
+    risk_assessment: RiskAssessment
+    cpic_guidelines: CPICGuidelines
+    pharmacogenomic_profile: PGxProfile
+    clinical_recommendation: ClinicalRecommendation
+    llm_generated_explanation: LLMExplanation
+    quality_metrics: QualityMetrics
@@ -3,16 +3,65 @@ Core risk prediction engine for PharmaGuard
 Combines VCF parsing, genotype-phenotype mapping, and drug risk assessment
 Enhanced with CPIC-aligned phenotype conversion and risk prediction algorithms
 """
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Dict, List, Optional, Tuple
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
 import uuid
+
+try:
+    import orjson  # Optional C encoder; output matches the json.dumps fallback
+except ImportError:
+    orjson = None
+
 from src.vcf_parser import VCFParser, Variant
 from src.gene_models import GENOTYPE_PHENOTYPE_MAP, Phenotype, RiskLevel
 from src.drug_mapping import get_drug_recommendations
 from src.genotype_phenotype import GenotypePhenotypeConverter
 from src.phenotype_risk_mapper import PhenotypeRiskPredictor
 from src.llm_explainer import LLMExplainer # Import the new LLM Explainer
+from src.report_types import (
+    CPICGuidelines, ClinicalRecommendation, DrugAssessment, LLMExplanation,
+    PGxProfile, QualityMetrics, RiskAssessment,
+)
+
+# Severity reported for each risk level
+RISK_SEVERITY = MappingProxyType({
+    "Safe": "none",
+    "Adjust Dosage": "moderate",
+    "Toxic": "critical",
+    "Ineffective": "high",
+    "Unknown": "none",
+})
+
+# Genes phenotyped by GenotypePhenotypeConverter (activity scores); others
+# use the legacy GENOTYPE_PHENOTYPE_MAP table
+CONVERTER_GENES = frozenset({
+    "CYP2D6", "CYP2C19", "CYP2C9", "TPMT", "SLCO1B1", "DPYD", "CYP3A4", "CYP3A5",
+})
+
+# Gene driving the detailed CPIC risk for each drug
+DRUG_PRIMARY_GENE = MappingProxyType({
+    "Codeine": "CYP2D6",
+    "Tramadol": "CYP2D6",
+    "Metoprolol": "CYP2D6",
+    "Amitriptyline": "CYP2D6",
+    "Warfarin": "CYP2C9",
+    "Clopidogrel": "CYP2C19",
+    "Simvastatin": "SLCO1B1",
+    "Azathioprine": "TPMT",
+    "Fluorouracil": "DPYD",
+})
+
+
+def _json_default(obj):
+    """Stdlib encoder fallback: report records as dicts, anything else as str"""
+    if isinstance(obj, DrugAssessment):
+        return obj.to_dict()
+    return str(obj)
 
 
 class RiskPredictor:
@@ -24,6 +73,11 @@ class RiskPredictor:
         self.phenotype_converter = GenotypePhenotypeConverter()
         self.risk_predictor = PhenotypeRiskPredictor()
         
+        # Upper bound on LLM requests in flight per report
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        if self.max_concurrency <= 0:
+            raise ValueError("LLM_MAX_CONCURRENCY must be positive")
+        
         # Initialize LLM Explainer with error handling
         try:
             self.llm_explainer = LLMExplainer()
@@ -61,8 +115,7 @@ class RiskPredictor:
             Phenotype or None if mapping not found
         """
         # First try the advanced converter for supported genes
-        supported_genes = ["CYP2D6", "CYP2C19", "CYP2C9", "TPMT", "SLCO1B1", "DPYD", "CYP3A4", "CYP3A5"]
-        if gene in supported_genes and genotype:
+        if gene in CONVERTER_GENES and genotype:
             try:
                 phenotype = self.phenotype_converter.convert_diplotype_to_phenotype(gene, genotype)
                 return phenotype
@@ -87,7 +140,10 @@ class RiskPredictor:
     def predict_from_vcf(
         self,
         vcf_path: str,
-        drugs: List[str]
+        drugs: List[str],
+        parser: Optional[VCFParser] = None,
+        offline: bool = False,
+        as_json: bool = True
     ) -> Dict:
         """
         Full prediction pipeline from VCF file
@@ -95,6 +151,13 @@ class RiskPredictor:
         Args:
             vcf_path: Path to VCF file
             drugs: List of drug names to assess
+            parser: Already-parsed vcf_path (e.g. load_vcf in tests);
+                    the file is parsed afresh when omitted
+            offline: Batch report jobs only: send LLM prompts through the
+                     OpenAI Batch API, waiting up to LLMExplainer.BATCH_TIMEOUT.
+                     Never set on interactive (API/app) requests
+            as_json: Return the report as a 'json_output' string; when
+                     False, as 'assessments' (a list of dicts) instead
         
         Returns:
             {
@@ -103,12 +166,14 @@ class RiskPredictor:
                 'phenotypes': {...},
                 'drug_risks': {...},
                 'detailed_risks': {...},  # New: detailed phenotype-based risks
-                'json_output': JSON string
+                'json_output': JSON string,  # or, when as_json is False,
+                'assessments': [...]         # the report entries as dicts
             }
         """
         try:
             # Parse VCF
-            parser = VCFParser(vcf_path)
+            if parser is None:
+                parser = VCFParser(vcf_path)
             variants_by_gene = parser.get_genes_present()
             
             # Convert variants to genotypes and phenotypes using advanced algorithm
@@ -154,18 +219,22 @@ class RiskPredictor:
                     }
                     detailed_risks[drug] = {"error": str(e)}
             
-            # Generate JSON output
-            json_output = self._generate_json_output(genotypes, phenotypes, drug_risks, detailed_risks)
-            
-            return {
+            # Render the report only in the form the caller asked for;
+            # callers that want objects need not parse 'json_output' back
+            assessments = self._build_assessments(genotypes, phenotypes, drug_risks, detailed_risks, offline)
+            result = {
                 'success': True,
                 'errors': [],
                 'genotypes': genotypes,
                 'phenotypes': phenotypes,
                 'drug_risks': drug_risks,
                 'detailed_risks': detailed_risks,
-                'json_output': json_output,
             }
+            if as_json:
+                result['json_output'] = self._dump_json(assessments)
+            else:
+                result['assessments'] = [assessment.to_dict() for assessment in assessments]
+            return result
         
         except Exception as e:
             return {
@@ -176,15 +245,6 @@ class RiskPredictor:
                 'drug_risks': {},
                 'detailed_risks': {},
             }
-        
-        return {
-            'success': True,
-            'errors': [],
-            'genotypes': genotypes,
-            'phenotypes': phenotypes,
-            'drug_risks': drug_risks,
-            'json_output': json_output,
-        }
     
     
     def get_detailed_drug_risk(self, drug: str, phenotypes: Dict) -> Dict:
@@ -196,20 +256,8 @@ class RiskPredictor:
         Returns:
             Detailed risk assessment with clinical guidance
         """
-        # Map drug to relevant gene(s)
-        drug_gene_map = {
-            "Codeine": "CYP2D6",
-            "Tramadol": "CYP2D6",
-            "Metoprolol": "CYP2D6",
-            "Amitriptyline": "CYP2D6",
-            "Warfarin": "CYP2C9",
-            "Clopidogrel": "CYP2C19",
-            "Simvastatin": "SLCO1B1",
-            "Azathioprine": "TPMT",
-            "Fluorouracil": "DPYD",
-        }
-        
-        gene = drug_gene_map.get(drug)
+        # Map drug to relevant gene
+        gene = DRUG_PRIMARY_GENE.get(drug)
         if not gene:
             return {"error": f"No gene mapping for {drug}"}
         
@@ -228,8 +276,92 @@ class RiskPredictor:
             "details": risk_details
         }
     
-    def _generate_json_output(self, genotypes, phenotypes, drug_risks, detailed_risks=None) -> str:
-        """Generate comprehensive JSON output with CPIC guidelines, LLM explanations, and detailed phenotype-risk mapping"""
+    def _prefetch_llm_explanations(self, genotypes, phenotypes, drug_risks,
+                                   primary_gene, phenotype_obj,
+                                   offline=False) -> Tuple[Dict, Dict, Dict, Dict]:
+        """
+        Fetch every LLM explanation the report needs before it is assembled
+        
+        Returns variant explanations by gene, risk and dosing explanations by
+        drug, and the monitoring (phenotype) interpretation for the primary
+        gene. Missing entries mean the rule-based text is used.
+        """
+        if not self.llm_available:
+            return {}, {}, {}, {}
+        
+        # Every drug assessment is based on the primary gene, so that is the
+        # only variant explanation worth requesting; other detected variants
+        # are listed in the profile without one
+        variant_cases = {}
+        for gene, genotype in genotypes.items():
+            if gene == primary_gene and drug_risks and genotype and phenotypes.get(gene):
+                variant_cases[gene] = {
+                    "gene": gene,
+                    "diplotype": f"{genotype[0]}/{genotype[1]}",
+                    "phenotype": phenotypes[gene].value,
+                    "activity_score": getattr(phenotypes[gene], 'activity_score', 1.0),
+                }
+        
+        risk_cases = {}
+        dosing_cases = {}
+        if primary_gene and phenotype_obj:
+            for drug, risk_rec in drug_risks.items():
+                risk_level = risk_rec.get('risk_level', 'Unknown')
+                risk_cases[drug] = {
+                    "drug": drug,
+                    "gene": primary_gene,
+                    "phenotype": phenotype_obj.value,
+                    "risk_level": risk_level,
+                    "clinical_guidance": risk_rec.get('clinical_guidance', f"Standard CPIC guidance for {drug}"),
+                }
+                dosing_cases[drug] = {
+                    "drug": drug,
+                    "phenotype": phenotype_obj.value,
+                    "gene": primary_gene,
+                    "standard_dose": "Unknown",
+                    "risk_level": risk_level,
+                }
+        
+        # The Batch API is only wired up for OpenAI
+        offline = offline and getattr(self.llm_explainer, 'provider', None) == "openai"
+        
+        def fetch_batch(batch, cases):
+            if not cases:
+                return {}
+            try:
+                return dict(zip(cases, batch(list(cases.values()), offline=offline)))
+            except Exception:
+                return {}  # Fall back to rule-based text if LLM unavailable
+        
+        def fetch_one(explain, **kwargs):
+            try:
+                return explain(**kwargs)
+            except Exception:
+                return {}
+        
+        # All requests are independent network calls: run them together,
+        # bounded by the configured concurrency
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            variant_future = pool.submit(fetch_batch, self.llm_explainer.get_variant_explanations_batch, variant_cases)
+            risk_future = pool.submit(fetch_batch, self.llm_explainer.get_risk_explanations_batch, risk_cases)
+            dosing_future = pool.submit(fetch_batch, self.llm_explainer.get_dosing_adjustments_batch, dosing_cases)
+            # Monitoring guidance depends only on the primary gene
+            monitor_future = None
+            if primary_gene and phenotype_obj:
+                monitor_future = pool.submit(
+                    fetch_one,
+                    self.llm_explainer.get_phenotype_interpretation,
+                    gene=primary_gene,
+                    phenotype=phenotype_obj.value,
+                    activity_score=getattr(phenotype_obj, 'activity_score', 1.0)
+                )
+        
+        monitor_exp = monitor_future.result() if monitor_future else {}
+        return variant_future.result(), risk_future.result(), dosing_future.result(), monitor_exp
+    
+    def _build_assessments(self, genotypes, phenotypes, drug_risks, detailed_risks=None,
+                           offline=False) -> List[DrugAssessment]:
+        """Build the per-drug report entries with CPIC guidelines, LLM explanations, and detailed phenotype-risk mapping"""
         
         # Initialize detailed_risks if not provided
         if detailed_risks is None:
@@ -239,52 +371,49 @@ class RiskPredictor:
         patient_id = f"PATIENT_{uuid.uuid4().hex[:8].upper()}"
         timestamp = datetime.now().isoformat()
         
+        # Find primary gene (first detected gene); it is the same for every drug
+        primary_gene = None
+        diplotype = None
+        primary_genotype = None
+        for gene, genotype in genotypes.items():
+            if genotype and gene in ["CYP2D6", "CYP2C19", "CYP2C9", "TPMT", "SLC01B1", "DPYD"]:
+                primary_gene = gene
+                primary_genotype = genotype
+                diplotype = f"{genotype[0]}/{genotype[1]}" if genotype else "*1/*1"
+                break
+
+        # Get phenotype value
+        primary_phenotype = "Unknown"
+        phenotype_obj = None
+        if primary_gene and primary_gene in phenotypes:
+            pheno = phenotypes[primary_gene]
+            if pheno:
+                phenotype_obj = pheno
+                # Map phenotype to abbreviation
+                pheno_map = {
+                    "Ultra-Rapid Metabolizer": "URM",
+                    "Rapid Metabolizer": "RM",
+                    "Normal Metabolizer": "NM",
+                    "Intermediate Metabolizer": "IM",
+                    "Poor Metabolizer": "PM",
+                    "No Function": "NF",
+                }
+                primary_phenotype = pheno_map.get(pheno.value, "Unknown")
+        
+        # Request every LLM explanation the report needs up front: variant,
+        # risk and dosing prompts are batched, all run concurrently
+        variant_exps, risk_exps, dosing_exps, monitor_exp = self._prefetch_llm_explanations(
+            genotypes, phenotypes, drug_risks, primary_gene, phenotype_obj, offline
+        )
+        
         # Build output for each drug
         risk_assessments = []
         
         for drug, risk_rec in drug_risks.items():
-            # Map risk level to severity
-            risk_severity_map = {
-                "Safe": "none",
-                "Adjust Dosage": "moderate",
-                "Toxic": "critical",
-                "Ineffective": "high",
-                "Unknown": "none",
-            }
-            
             risk_level = risk_rec.get('risk_level', 'Unknown')
-            severity = risk_severity_map.get(risk_level, "none")
+            severity = RISK_SEVERITY.get(risk_level, "none")
             confidence = 0.95 if risk_level != "Unknown" else 0.5
             
-            # Find primary gene for this drug (first detected gene)
-            primary_gene = None
-            diplotype = None
-            primary_genotype = None
-            for gene, genotype in genotypes.items():
-                if genotype and gene in ["CYP2D6", "CYP2C19", "CYP2C9", "TPMT", "SLC01B1", "DPYD"]:
-                    primary_gene = gene
-                    primary_genotype = genotype
-                    diplotype = f"{genotype[0]}/{genotype[1]}" if genotype else "*1/*1"
-                    break
-            
-            # Get phenotype value
-            primary_phenotype = "Unknown"
-            phenotype_obj = None
-            if primary_gene and primary_gene in phenotypes:
-                pheno = phenotypes[primary_gene]
-                if pheno:
-                    phenotype_obj = pheno
-                    # Map phenotype to abbreviation
-                    pheno_map = {
-                        "Ultra-Rapid Metabolizer": "URM",
-                        "Rapid Metabolizer": "RM",
-                        "Normal Metabolizer": "NM",
-                        "Intermediate Metabolizer": "IM",
-                        "Poor Metabolizer": "PM",
-                        "No Function": "NF",
-                    }
-                    primary_phenotype = pheno_map.get(pheno.value, "Unknown")
-            
             # Build detected variants with LLM explanations
             detected_variants = []
             for gene, genotype in genotypes.items():
@@ -297,19 +426,10 @@ class RiskPredictor:
                     }
                     
                     # Add LLM explanation for this variant if available
-                    if self.llm_available and phenotypes.get(gene):
-                        try:
-                            variant_exp = self.llm_explainer.get_variant_explanation(
-                                gene=gene,
-                                diplotype=f"{genotype[0]}/{genotype[1]}",
-                                phenotype=phenotypes[gene].value,
-                                activity_score=getattr(phenotypes[gene], 'activity_score', 1.0)
-                            )
-                            if variant_exp.get('status') == 'success':
-                                variant_entry['llm_explanation'] = variant_exp['summary']
-                                variant_entry['llm_cached'] = variant_exp.get('from_cache', False)
-                        except Exception as e:
-                            pass  # Skip if LLM unavailable
+                    variant_exp = variant_exps.get(gene, {})
+                    if variant_exp.get('status') == 'success':
+                        variant_entry['llm_explanation'] = variant_exp['summary']
+                        variant_entry['llm_cached'] = variant_exp.get('from_cache', False)
                     
                     detected_variants.append(variant_entry)
             
@@ -343,14 +463,7 @@ class RiskPredictor:
             # Get LLM explanations if available
             if self.llm_available and primary_gene and phenotype_obj:
                 try:
-                    # Get variant interpretation
-                    variant_exp = self.llm_explainer.get_variant_explanation(
-                        gene=primary_gene,
-                        diplotype=diplotype or "*1/*1",
-                        phenotype=phenotype_obj.value,
-                        activity_score=getattr(phenotype_obj, 'activity_score', 1.0)
-                    )
-                    
+                    variant_exp = variant_exps.get(primary_gene, {})
                     if variant_exp.get('status') == 'success':
                         variant_interpretation = variant_exp['summary']
                         llm_explanation_data['llm_used'] = True
@@ -361,39 +474,16 @@ class RiskPredictor:
                         if hasattr(self.llm_explainer, 'model'):
                             llm_explanation_data['llm_model'] = self.llm_explainer.model
                     
-                    # Get risk explanation
-                    risk_exp = self.llm_explainer.get_risk_explanation(
-                        drug=drug,
-                        gene=primary_gene,
-                        phenotype=phenotype_obj.value,
-                        risk_level=risk_level,
-                        clinical_guidance=risk_rec.get('clinical_guidance', f"Standard CPIC guidance for {drug}")
-                    )
-                    
+                    risk_exp = risk_exps.get(drug, {})
                     if risk_exp.get('status') == 'success':
                         risk_explanation = risk_exp['summary']
                         llm_explanation_data['llm_used'] = True
                         llm_explanation_data['llm_cached'] = risk_exp.get('from_cache', False)
                     
-                    # Get dosing adjustment
-                    dosing_exp = self.llm_explainer.get_dosing_adjustment(
-                        drug=drug,
-                        phenotype=phenotype_obj.value,
-                        gene=primary_gene,
-                        standard_dose="Unknown",
-                        risk_level=risk_level
-                    )
-                    
+                    dosing_exp = dosing_exps.get(drug, {})
                     if dosing_exp.get('status') == 'success':
                         dosing_recommendation = dosing_exp['summary']
                     
-                    # Get monitoring guidance
-                    monitor_exp = self.llm_explainer.get_phenotype_interpretation(
-                        gene=primary_gene,
-                        phenotype=phenotype_obj.value,
-                        activity_score=getattr(phenotype_obj, 'activity_score', 1.0)
-                    )
-                    
                     if monitor_exp.get('status') == 'success':
                         monitoring_guidance = monitor_exp['summary']
                         
@@ -402,58 +492,104 @@ class RiskPredictor:
                     pass
             
             # Build the entry with comprehensive CPIC data and LLM explanations
-            drug_entry = {
-                "patient_id": patient_id,
-                "drug": drug,
-                "timestamp": timestamp,
-                "risk_assessment": {
-                    "risk_label": risk_level,
-                    "confidence_score": confidence,
-                    "severity": severity,
-                },
-                "cpic_guidelines": {
-                    "recommendation_level": risk_rec.get('cpic_level', 'No data'),
-                    "strength_of_recommendation": risk_rec.get('strength', 'Moderate'),
-                    "clinical_guidance": risk_rec.get('clinical_guidance', ''),
-                    "cpic_evidence": cpic_evidence,
-                    "reference": risk_rec.get('reference', 'Manual review required'),
-                },
-                "pharmacogenomic_profile": {
-                    "primary_gene": primary_gene or "Unknown",
-                    "diplotype": diplotype or "*1/*1",
-                    "phenotype": primary_phenotype,
-                    "detected_variants": detected_variants,
-                },
-                "clinical_recommendation": {
-                    "summary": detailed_recommendation or risk_rec.get('explanation', ''),
-                    "dosing": dosing_recommendation if dosing_recommendation != "Consult pharmacist" else dose_adjustment or risk_rec.get('dosing_recommendation', ''),
-                    "monitoring": monitoring_guidance or risk_rec.get('monitoring', ''),
-                },
-                "llm_generated_explanation": {
-                    "variant_interpretation": variant_interpretation,
-                    "risk_explanation": risk_explanation,
-                    "clinical_impact": f"{primary_gene} ({primary_phenotype}): {risk_level}",
-                    "dosing_recommendation": dosing_recommendation,
-                    "monitoring_guidance": monitoring_guidance,
-                    "source": f"{llm_explanation_data['llm_provider']} LLM ({llm_explanation_data['llm_model']})" if llm_explanation_data['llm_used'] else "Rule-based fallback"
-                },
-                "quality_metrics": {
-                    "vcf_parsing_success": True,
-                    "genes_analyzed": list(genotypes.keys()),
-                    "variant_count": len([g for g in genotypes.values() if g]),
-                    "data_completeness": "standard",
-                    "algorithm_version": "CPIC-aligned-v2",
-                    "llm_used": llm_explanation_data['llm_used'],
-                    "llm_provider": llm_explanation_data['llm_provider'],
-                    "llm_model": llm_explanation_data['llm_model'],
-                    "llm_cached": llm_explanation_data['llm_cached'],
-                    "explanation_quality": "comprehensive" if llm_explanation_data['llm_used'] else "rule-based"
-                },
-            }
+            drug_entry = DrugAssessment(
+                patient_id=patient_id,
+                drug=drug,
+                timestamp=timestamp,
+                risk_assessment=RiskAssessment(
+                    risk_label=risk_level,
+                    confidence_score=confidence,
+                    severity=severity,
+                ),
+                cpic_guidelines=CPICGuidelines(
+                    recommendation_level=risk_rec.get('cpic_level', 'No data'),
+                    strength_of_recommendation=risk_rec.get('strength', 'Moderate'),
+                    clinical_guidance=risk_rec.get('clinical_guidance', ''),
+                    cpic_evidence=cpic_evidence,
+                    reference=risk_rec.get('reference', 'Manual review required'),
+                ),
+                pharmacogenomic_profile=PGxProfile(
+                    primary_gene=primary_gene or "Unknown",
+                    diplotype=diplotype or "*1/*1",
+                    phenotype=primary_phenotype,
+                    detected_variants=detected_variants,
+                ),
+                clinical_recommendation=ClinicalRecommendation(
+                    summary=detailed_recommendation or risk_rec.get('explanation', ''),
+                    dosing=dosing_recommendation if dosing_recommendation != "Consult pharmacist" else dose_adjustment or risk_rec.get('dosing_recommendation', ''),
+                    monitoring=monitoring_guidance or risk_rec.get('monitoring', ''),
+                ),
+                llm_generated_explanation=LLMExplanation(
+                    variant_interpretation=variant_interpretation,
+                    risk_explanation=risk_explanation,
+                    clinical_impact=f"{primary_gene} ({primary_phenotype}): {risk_level}",
+                    dosing_recommendation=dosing_recommendation,
+                    monitoring_guidance=monitoring_guidance,
+                    source=f"{llm_explanation_data['llm_provider']} LLM ({llm_explanation_data['llm_model']})" if llm_explanation_data['llm_used'] else "Rule-based fallback"
+                ),
+                quality_metrics=QualityMetrics(
+                    vcf_parsing_success=True,
+                    genes_analyzed=list(genotypes.keys()),
+                    variant_count=len([g for g in genotypes.values() if g]),
+                    data_completeness="standard",
+                    algorithm_version="CPIC-aligned-v2",
+                    llm_used=llm_explanation_data['llm_used'],
+                    llm_provider=llm_explanation_data['llm_provider'],
+                    llm_model=llm_explanation_data['llm_model'],
+                    llm_cached=llm_explanation_data['llm_cached'],
+                    explanation_quality="comprehensive" if llm_explanation_data['llm_used'] else "rule-based"
+                ),
+            )
             
             risk_assessments.append(drug_entry)
         
-        return json.dumps(risk_assessments, indent=2, default=str)
+        return risk_assessments
+    
+    def _generate_json_output(self, genotypes, phenotypes, drug_risks, detailed_risks=None) -> str:
+        """Generate comprehensive JSON output with CPIC guidelines, LLM explanations, and detailed phenotype-risk mapping"""
+        return self._dump_json(
+            self._build_assessments(genotypes, phenotypes, drug_risks, detailed_risks)
+        )
+    
+    @staticmethod
+    def _dump_json(risk_assessments: List[DrugAssessment]) -> str:
+        """Serialize report entries as indented JSON
+
+        Non-ASCII text (e.g. "mg/m²") is written as is rather than as
+        \\u escapes, by both encoders; encode the result as UTF-8.
+        """
+        if orjson is not None:
+            # orjson encodes the slotted dataclasses natively, in field
+            # order; datetimes go through default=str, as with the stdlib
+            # encoder
+            return orjson.dumps(
+                risk_assessments,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_PASSTHROUGH_DATETIME,
+                default=str
+            ).decode()
+        return json.dumps(risk_assessments, indent=2, ensure_ascii=False, default=_json_default)
+    
+    def _write_json_output(self, fh: BinaryIO, genotypes, phenotypes, drug_risks, detailed_risks=None):
+        """Write the JSON report to a binary file, one drug entry at a time"""
+        self._stream_json(
+            self._build_assessments(genotypes, phenotypes, drug_risks, detailed_risks), fh
+        )
+    
+    @staticmethod
+    def _stream_json(risk_assessments: List[DrugAssessment], fh: BinaryIO):
+        """Write the same UTF-8 bytes as _dump_json without building the whole document"""
+        if orjson is None or not risk_assessments:
+            fh.write(RiskPredictor._dump_json(risk_assessments).encode())
+            return
+        option = orjson.OPT_INDENT_2 | orjson.OPT_PASSTHROUGH_DATETIME
+        fh.write(b"[")
+        for i, entry in enumerate(risk_assessments):
+            # Encoded strings never contain a raw newline, so re-indenting
+            # each line nests the entry exactly as a whole-list dump would
+            body = orjson.dumps(entry, option=option, default=str)
+            fh.write(b",\n  " if i else b"\n  ")
+            fh.write(body.replace(b"\n", b"\n  "))
+        fh.write(b"\n]")
     
     def assess_multiple_drugs(
         self,
@@ -469,3 +605,9 @@ class RiskPredictor:
             results[drug] = get_drug_recommendations(drug, phenotypes)
         
         return results
+
+
+@lru_cache(maxsize=1)
+def get_risk_predictor() -> RiskPredictor:
+    """Return the process-wide RiskPredictor, built on first use"""
+    return RiskPredictor()
@@ -3,14 +3,18 @@ VCF (Variant Call Format) Parser - Manual implementation without external genomi
 Parses standard VCF v4.2 files for pharmacogenomic analysis
 """
 
+import mmap
+import os
 import re
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Tuple, Optional
 
 
-@dataclass
-class Variant:
-    """Represents a genetic variant from VCF"""
+class Variant(NamedTuple):
+    """Represents a genetic variant from VCF (immutable)"""
     chrom: str
     pos: int
     ref: str
@@ -19,11 +23,9 @@ class Variant:
     rs_id: Optional[str] = None
     genotype: str = "0/0"  # Default: homozygous reference
     quality: float = 0.0
-    info: Dict[str, str] = None
-
-    def __post_init__(self):
-        if self.info is None:
-            self.info = {}
+    # VCFParser supplies the parsed INFO dict; the default is a shared,
+    # read-only empty mapping so .get() works without a per-variant dict
+    info: Mapping[str, str] = MappingProxyType({})
 
     def __repr__(self):
         return f"Variant({self.gene}:{self.rs_id} {self.ref}→{self.alt} GT:{self.genotype})"
@@ -73,41 +75,68 @@ class VCFParser:
         },
     }
 
+    # Flat lookup tables derived from the maps above so gene assignment is
+    # a dict lookup rather than a scan over every gene per VCF line
+    _RS_TO_GENE = {rs: gene for gene, variants in KNOWN_VARIANTS.items() for rs in variants}
+    # Reversed so that the first gene listed for a chromosome wins, as before
+    _CHROM_TO_GENE = {
+        name: gene
+        for gene, chrom in reversed(list(GENE_CHROMOSOMES.items()))
+        for name in (chrom, f"chr{chrom}")
+    }
+
     def __init__(self, filepath: str):
         """Initialize parser with VCF file path"""
         self.filepath = filepath
-        self.header = {}
+        self.header = defaultdict(list)
+        self.is_valid = False
         self.variants: List[Variant] = []
+        # Variants grouped by gene, built on the first filtered lookup
+        self._gene_index: Optional[Dict[str, List[Variant]]] = None
         self._parse()
+        # Expose a plain dict so missing header keys still raise KeyError
+        self.header = dict(self.header)
 
     def _parse(self):
         """Parse VCF file"""
         try:
-            with open(self.filepath, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            for line in lines:
-                line = line.strip()
-
-                # Skip empty lines
-                if not line:
-                    continue
-
-                # Parse header lines
-                if line.startswith('##'):
-                    self._parse_header_line(line)
-                    continue
-
-                # Parse column header
-                if line.startswith('#CHROM'):
-                    self.header['columns'] = line[1:].split('\t')
-                    continue
-
-                # Parse variant lines
-                if not line.startswith('#'):
-                    variant = self._parse_variant_line(line)
-                    if variant:
-                        self.variants.append(variant)
+            with open(self.filepath, 'rb') as f:
+                # Map the file so repeated parses of the same VCF are served
+                # straight from the page cache; empty files cannot be mapped
+                try:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    return
+
+                with data:
+                    # Check the fileformat header on the same read used for
+                    # parsing rather than reopening the file to validate it
+                    first_line = data.readline()
+                    self.is_valid = first_line.startswith(b'##fileformat=VCFv')
+
+                    for raw in chain((first_line,), iter(data.readline, b'')):
+                        # VCF fields never carry leading whitespace, so only
+                        # the line terminator needs removing
+                        raw = raw.rstrip(b'\r\n')
+
+                        # Skip empty lines
+                        if not raw:
+                            continue
+
+                        line = raw.decode('utf-8')
+
+                        # Dispatch on the first character: data lines are
+                        # the common case, header lines all start with '#'
+                        if line[0] != '#':
+                            variant = self._parse_variant_line(line)
+                            if variant:
+                                self.variants.append(variant)
+                        elif line[1:2] == '#':
+                            # Parse header lines
+                            self._parse_header_line(line)
+                        elif line.startswith('#CHROM'):
+                            # Parse column header
+                            self.header['columns'] = line[1:].split('\t')
 
         except FileNotFoundError:
             print(f"Error: File {self.filepath} not found")
@@ -115,27 +144,34 @@ class VCFParser:
 
     def _parse_header_line(self, line: str):
         """Parse VCF header metadata"""
-        if '=' in line:
-            key, value = line[2:].split('=', 1)
-            if key not in self.header:
-                self.header[key] = []
+        key, sep, value = line[2:].partition('=')
+        if sep:
             self.header[key].append(value)
 
     def _parse_variant_line(self, line: str) -> Optional[Variant]:
         """Parse a single variant line"""
-        fields = line.split('\t')
+        # Stop splitting after the FORMAT column; all sample columns stay in
+        # one trailing string and only the first sample is ever used
+        fields = line.split('\t', 9)
 
         if len(fields) < 10:
             return None
 
-        chrom, pos, rs_id, ref, alt, qual, filt, info, fmt, sample = fields[:10]
+        chrom, pos, rs_id, ref, alt, qual, filt, info, fmt, sample = fields
 
-        # Extract gene from annotation (simplified)
-        gene = self._extract_gene(chrom, int(pos), rs_id)
+        # Extract gene from annotation (simplified). Most lines of a
+        # whole-genome VCF are not pharmacogenomic, so reject them before
+        # any INFO or sample parsing is done
+        pos = int(pos)
+        gene = self._extract_gene(chrom, pos, rs_id)
 
         if not gene:
             return None
 
+        tab = sample.find('\t')
+        if tab >= 0:
+            sample = sample[:tab]
+
         # Parse INFO field
         info_dict = self._parse_info_field(info)
 
@@ -143,16 +179,17 @@ class VCFParser:
         genotype = self._parse_genotype(fmt, sample)
 
         try:
+            # Positional construction in field order skips keyword matching
             variant = Variant(
-                chrom=chrom,
-                pos=int(pos),
-                ref=ref,
-                alt=alt,
-                gene=gene,
-                rs_id=rs_id if rs_id != '.' else None,
-                genotype=genotype,
-                quality=float(qual) if qual != '.' else 0.0,
-                info=info_dict
+                chrom,
+                pos,
+                ref,
+                alt,
+                gene,
+                rs_id if rs_id != '.' else None,
+                genotype,
+                float(qual) if qual != '.' else 0.0,
+                info_dict,
             )
             return variant
         except (ValueError, IndexError):
@@ -164,58 +201,53 @@ class VCFParser:
         if info_str == '.':
             return info_dict
 
-        for item in info_str.split(';'):
-            if '=' in item:
-                key, value = item.split('=', 1)
-                info_dict[key] = value
-            else:
-                info_dict[item] = True
+        # Walk the ';'-separated entries in place instead of materialising
+        # the split list and a second split per entry
+        start = 0
+        end = len(info_str)
+        while start <= end:
+            stop = info_str.find(';', start)
+            if stop < 0:
+                stop = end
+            key, sep, value = info_str[start:stop].partition('=')
+            info_dict[key] = value if sep else True
+            start = stop + 1
 
         return info_dict
 
     def _parse_genotype(self, fmt_str: str, sample_str: str) -> str:
         """Extract genotype from FORMAT and sample columns"""
-        if ':' not in fmt_str or ':' not in sample_str:
+        # GT must be the first FORMAT key; only the leading sample value is
+        # needed, so locate it without splitting either column
+        if not fmt_str.startswith('GT:'):
             return "0/0"
 
-        format_fields = fmt_str.split(':')
-        sample_fields = sample_str.split(':')
-
-        if len(format_fields) > 0 and len(sample_fields) > 0:
-            if format_fields[0] == 'GT':
-                return sample_fields[0]
+        end = sample_str.find(':')
+        if end < 0:
+            return "0/0"
 
-        return "0/0"
+        return sample_str[:end]
 
     def _extract_gene(self, chrom: str, pos: int, rs_id: str) -> Optional[str]:
         """Determine gene from chromosome and position"""
-        # First check if RS ID matches known variants
-        if rs_id != '.':
-            for gene, variants in self.KNOWN_VARIANTS.items():
-                if rs_id in variants:
-                    return gene
-
-        # Fallback: match by chromosome
-        for gene, gene_chrom in self.GENE_CHROMOSOMES.items():
-            if chrom == gene_chrom or chrom == f"chr{gene_chrom}":
-                return gene
-
-        return None
+        # First check if RS ID matches known variants, then fall back to
+        # matching by chromosome
+        return self._RS_TO_GENE.get(rs_id) or self._CHROM_TO_GENE.get(chrom)
 
     def get_variants(self, gene: Optional[str] = None) -> List[Variant]:
         """Get variants, optionally filtered by gene"""
         if gene:
-            return [v for v in self.variants if v.gene == gene]
+            if self._gene_index is None:
+                self._gene_index = self.get_genes_present()
+            return list(self._gene_index.get(gene, ()))
         return self.variants
 
     def get_genes_present(self) -> Dict[str, List[Variant]]:
         """Return variants grouped by gene"""
-        genes_dict = {}
+        genes_dict = defaultdict(list)
         for variant in self.variants:
-            if variant.gene not in genes_dict:
-                genes_dict[variant.gene] = []
             genes_dict[variant.gene].append(variant)
-        return genes_dict
+        return dict(genes_dict)
 
     def summary(self) -> Dict:
         """Get summary statistics"""
@@ -227,8 +259,39 @@ class VCFParser:
         }
 
 
+@lru_cache(maxsize=16)
+def _load_vcf_cached(filepath: str, mtime_ns: int, size: int, inode: int) -> VCFParser:
+    """Parse a VCF file; the stat fields are part of the cache key only"""
+    parser = VCFParser(filepath)
+    # Shared between callers: build the lazy gene index now so no caller
+    # mutates the cached parser
+    parser._gene_index = parser.get_genes_present()
+    return parser
+
+
+def load_vcf(filepath: str) -> VCFParser:
+    """Return a parsed VCF, reusing the previous parse while the file is unchanged
+
+    For test suites that load the same sample files repeatedly; pass the
+    result to RiskPredictor.predict_from_vcf(parser=...). Uploads should
+    not go through this cache, since they reuse file names. The returned
+    parser, including its variants list, is shared between callers and
+    must be treated as read-only.
+    """
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        # Let VCFParser report the missing file as usual
+        return VCFParser(filepath)
+    return _load_vcf_cached(filepath, st.st_mtime_ns, st.st_size, st.st_ino)
+
+
 def validate_vcf(filepath: str) -> Tuple[bool, str]:
-    """Quick validation that file is VCF format"""
+    """Quick validation that file is VCF format
+
+    When the file is being parsed anyway, prefer VCFParser.is_valid which is
+    set from the same read.
+    """
     try:
         with open(filepath, 'r') as f:
             first_line = f.readline().strip()
@@ -11,6 +11,10 @@ from pathlib import Path
 # API base URL
 BASE_URL = "http://localhost:8000"
 
+# Shared session so every request, including result polling, reuses one
+# keep-alive connection
+SESSION = requests.Session()
+
 def print_response(title: str, response):
     """Pretty print API response"""
     print(f"\n{'='*80}")
@@ -26,25 +30,32 @@ def print_response(title: str, response):
 def test_health_check():
     """Test health check endpoint"""
     print("\n[1/4] Testing Health Check")
-    response = requests.get(f"{BASE_URL}/health")
+    response = SESSION.get(f"{BASE_URL}/health")
     print_response("HEALTH CHECK", response)
     return response.status_code == 200
 
 
+def test_health(client):
+    """Health check served in-process (pytest, no running server needed)"""
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["status"] == "healthy"
+
+
 def test_upload():
     """Test file upload endpoint"""
     print("\n[2/4] Testing Upload Endpoint")
     
     # Use sample VCF file
-    vcf_file = "sample_vcf/comprehensive_test.vcf"
+    vcf_file = Path("sample_vcf/comprehensive_test.vcf")
     
-    if not Path(vcf_file).exists():
+    if not vcf_file.exists():
         print(f"✗ VCF file not found: {vcf_file}")
         return None
     
     with open(vcf_file, 'rb') as f:
-        files = {'file': (Path(vcf_file).name, f)}
-        response = requests.post(f"{BASE_URL}/upload", files=files)
+        files = {'file': (vcf_file.name, f)}
+        response = SESSION.post(f"{BASE_URL}/upload", files=files)
     
     print_response("UPLOAD RESPONSE", response)
     
@@ -62,7 +73,7 @@ def test_analyze(file_id: str):
         "drugs": ["Codeine", "Warfarin", "Clopidogrel"]
     }
     
-    response = requests.post(f"{BASE_URL}/analyze", json=payload)
+    response = SESSION.post(f"{BASE_URL}/analyze", json=payload)
     print_response("ANALYZE RESPONSE", response)
     
     if response.status_code == 200:
@@ -75,17 +86,18 @@ def test_results(analysis_id: str):
     print("\n[4/4] Testing Results Endpoint")
     
     max_wait = 60  # seconds
-    poll_interval = 2  # seconds
+    poll_interval = 0.2  # seconds, grows by 1.5x per poll
+    max_poll_interval = 2  # seconds
     elapsed = 0
     
     while elapsed < max_wait:
-        response = requests.get(f"{BASE_URL}/results/{analysis_id}")
+        response = SESSION.get(f"{BASE_URL}/results/{analysis_id}")
         
         if response.status_code == 200:
             data = response.json()
             status = data['status']
             
-            print(f"Status: {status} (elapsed: {elapsed}s)")
+            print(f"Status: {status} (elapsed: {elapsed:.1f}s)")
             
             if status == "completed":
                 print_response("RESULTS RESPONSE", response)
@@ -134,9 +146,10 @@ def test_results(analysis_id: str):
             print(f"✗ Request failed with status {response.status_code}")
             return False
         
-        # Wait and retry
+        # Wait and retry, backing off so short analyses are picked up quickly
         time.sleep(poll_interval)
         elapsed += poll_interval
+        poll_interval = min(poll_interval * 1.5, max_poll_interval)
     
     print(f"✗ Analysis timed out after {max_wait} seconds")
     return False
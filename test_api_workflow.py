@@ -7,18 +7,17 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.risk_predictor import RiskPredictor
+from src.risk_predictor import get_risk_predictor
+from src.vcf_parser import load_vcf
 
-def test_complete_api_workflow():
+def test_complete_api_workflow(predictor):
     """Test the complete API workflow suitable for frontend integration."""
     
     print("=" * 80)
     print("API WORKFLOW TEST: Complete Frontend Integration")
     print("=" * 80)
     
-    # Initialize predictor
-    print("\n1. Initializing RiskPredictor...")
-    predictor = RiskPredictor()
+    print("\n1. Using the shared RiskPredictor")
     print(f"   ✓ LLM Available: {predictor.llm_available}")
     print(f"   ✓ Provider: Groq API")
     
@@ -27,7 +26,7 @@ def test_complete_api_workflow():
     vcf_path = "sample_vcf/warfarin_dose.vcf"
     drugs = ["Warfarin"]
     
-    result = predictor.predict_from_vcf(vcf_path, drugs)
+    result = predictor.predict_from_vcf(vcf_path, drugs, parser=load_vcf(vcf_path))
     
     if result is None:
         print("   ✗ Failed to process VCF")
@@ -166,5 +165,5 @@ def test_complete_api_workflow():
 
 
 if __name__ == "__main__":
-    success = test_complete_api_workflow()
+    success = test_complete_api_workflow(get_risk_predictor())
     sys.exit(0 if success else 1)
@@ -4,9 +4,16 @@ Test script showing CPIC-enhanced drug recommendations
 Demonstrates integration of CPIC dosing rules with risk predictions
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 from src.drug_mapping import get_drug_recommendations
 from src.gene_models import Phenotype
 
+
+def _truncate(text, limit=85):
+    """Shorten text longer than limit to fit one output line"""
+    return text if len(text) <= limit else f"{text[:limit - 1]}..."
+
 def test_cpic_recommendations():
     """Test CPIC-enhanced drug recommendations"""
     print("=" * 90)
@@ -67,14 +74,18 @@ def test_cpic_recommendations():
         }
     ]
     
-    for i, test in enumerate(test_cases, 1):
+    # Lookups are independent; fetch them together, then report in order
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        recommendations = list(executor.map(
+            lambda test: get_drug_recommendations(test["drug"], test["phenotypes"]),
+            test_cases
+        ))
+    
+    for i, (test, rec) in enumerate(zip(test_cases, recommendations), 1):
         print(f"\n{'=' * 90}")
         print(f"TEST {i}: {test['scenario']}")
         print(f"{'=' * 90}")
         
-        # Get recommendation
-        rec = get_drug_recommendations(test["drug"], test["phenotypes"])
-        
         # Display results
         print(f"\nDrug Input: {test['drug']}")
         print(f"→ Canonical Name: {rec['drug']}")
@@ -88,33 +99,17 @@ def test_cpic_recommendations():
         print(f"  • Reference: {rec.get('reference', 'N/A')}")
         
         print(f"\nDosing Recommendation:")
-        dosing = rec.get('dosing_recommendation', 'N/A')
-        if len(dosing) > 85:
-            print(f"  {dosing[:84]}...")
-        else:
-            print(f"  {dosing}")
+        print(f"  {_truncate(rec.get('dosing_recommendation', 'N/A'))}")
         
         if rec.get('clinical_guidance'):
             print(f"\nClinical Guidance:")
-            guidance = rec.get('clinical_guidance', '')
-            if len(guidance) > 85:
-                print(f"  {guidance[:84]}...")
-            else:
-                print(f"  {guidance}")
+            print(f"  {_truncate(rec['clinical_guidance'])}")
         
         print(f"\nMonitoring:")
-        monitoring = rec.get('monitoring', 'N/A')
-        if len(monitoring) > 85:
-            print(f"  {monitoring[:84]}...")
-        else:
-            print(f"  {monitoring}")
+        print(f"  {_truncate(rec.get('monitoring', 'N/A'))}")
         
         print(f"\nExplanation:")
-        explanation = rec.get('explanation', 'N/A')
-        if len(explanation) > 85:
-            print(f"  {explanation[:84]}...")
-        else:
-            print(f"  {explanation}")
+        print(f"  {_truncate(rec.get('explanation', 'N/A'))}")
     
     # Summary
     print(f"\n{'=' * 90}")
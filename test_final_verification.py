@@ -1,35 +1,62 @@
 """
 FINAL VERIFICATION: Complete LLM Integration System Test
+Run: python test_final_verification.py  (or: pytest test_final_verification.py)
 """
 import sys
-import json
+from functools import lru_cache
+from inspect import signature
 from pathlib import Path
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.risk_predictor import RiskPredictor
+from src.risk_predictor import get_risk_predictor
 from src.gene_models import Phenotype
 
-print("=" * 80)
-print("FINAL VERIFICATION TEST: LLM Integration System")
-print("=" * 80)
+
+@lru_cache(maxsize=None)
+def _generate_assessments(predictor):
+    """Generate the Codeine test assessment once per predictor"""
+    test_genotypes = {"CYP2D6": ("*1", "*1")}
+    test_phenotypes = {"CYP2D6": Phenotype.ULTRA_RAPID}
+    test_drug_risks = {
+        "Codeine": {
+            "drug": "Codeine",
+            "risk_level": "Toxic",
+            "explanation": "Test",
+            "dosing_recommendation": "Avoid",
+            "monitoring": "Monitor",
+            "cpic_level": "1A",
+            "strength": "Strong",
+            "clinical_guidance": "Test",
+            "reference": "Test"
+        }
+    }
+
+    json_output = predictor._generate_json_output(
+        test_genotypes, test_phenotypes, test_drug_risks
+    )
+    return json_loads(json_output)
+
 
 # Test 1: System Initialization
-print("\n[1/5] System Initialization")
-try:
-    predictor = RiskPredictor()
+def test_system_initialization(predictor):
+    print("\n[1/5] System Initialization")
     print(f"    ✓ RiskPredictor initialized")
     print(f"    ✓ LLM Available: {predictor.llm_available}")
     if predictor.llm_available:
-        print(f"    ✓ Provider: {predictor.llm_explainer.provider}")
-        print(f"    ✓ Model: {predictor.llm_explainer.model}")
-except Exception as e:
-    print(f"    ✗ Failed: {e}")
-    sys.exit(1)
+        llm = predictor.llm_explainer
+        print(f"    ✓ Provider: {llm.provider}")
+        print(f"    ✓ Model: {llm.model}")
+
 
 # Test 2: LLM Explanation Methods
-print("\n[2/5] LLM Explanation Methods")
-try:
+def test_llm_explanation_methods(llm):
+    print("\n[2/5] LLM Explanation Methods")
     methods = [
         'get_variant_explanation',
         'get_risk_explanation',
@@ -38,139 +65,150 @@ try:
         'get_phenotype_interpretation',
         'get_cache_stats'
     ]
-    
+
     for method in methods:
-        if hasattr(predictor.llm_explainer, method):
+        if hasattr(llm, method):
             print(f"    ✓ {method} available")
         else:
             print(f"    ✗ {method} missing")
             raise AttributeError(f"{method} not found")
-except Exception as e:
-    print(f"    ✗ Failed: {e}")
-    sys.exit(1)
+
 
 # Test 3: JSON Output Generation
-print("\n[3/5] JSON Output Generation")
-try:
-    test_genotypes = {"CYP2D6": ("*1", "*1")}
-    test_phenotypes = {"CYP2D6": Phenotype.ULTRA_RAPID}
-    test_drug_risks = {
-        "Codeine": {
-            "drug": "Codeine",
-            "risk_level": "Toxic",
-            "explanation": "Test",
-            "dosing_recommendation": "Avoid",
-            "monitoring": "Monitor",
-            "cpic_level": "1A",
-            "strength": "Strong",
-            "clinical_guidance": "Test",
-            "reference": "Test"
-        }
-    }
-    
-    json_output = predictor._generate_json_output(
-        test_genotypes, test_phenotypes, test_drug_risks
-    )
-    
-    data = json.loads(json_output)
+def test_json_output_generation(predictor):
+    print("\n[3/5] JSON Output Generation")
+    data = _generate_assessments(predictor)
     print(f"    ✓ JSON generated successfully")
     print(f"    ✓ Valid JSON format")
     print(f"    ✓ {len(data)} drug assessment(s)")
-except Exception as e:
-    print(f"    ✗ Failed: {e}")
-    import traceback
-    traceback.print_exc()
-    sys.exit(1)
+
 
 # Test 4: LLM Explanations in Output
-print("\n[4/5] LLM Explanations in Output")
-try:
-    assessment = data[0]
-    
+def test_llm_explanations_in_output(predictor):
+    print("\n[4/5] LLM Explanations in Output")
+    assessment = _generate_assessments(predictor)[0]
+
     required_fields = [
         'patient_id', 'drug', 'risk_assessment',
         'pharmacogenomic_profile', 'llm_generated_explanation',
         'quality_metrics'
     ]
-    
+
     for field in required_fields:
         if field in assessment:
             print(f"    ✓ {field} present")
         else:
             print(f"    ✗ {field} missing")
             raise KeyError(f"{field} not found in assessment")
-    
+
     # Verify LLM fields
-    llm = assessment['llm_generated_explanation']
-    llm_fields = ['variant_interpretation', 'risk_explanation', 
+    llm_output = assessment['llm_generated_explanation']
+    llm_fields = ['variant_interpretation', 'risk_explanation',
                   'dosing_recommendation', 'monitoring_guidance', 'source']
-    
+
     for field in llm_fields:
-        if field in llm and llm[field]:
-            print(f"    ✓ LLM {field}: {len(llm[field])} chars")
+        if field in llm_output and llm_output[field]:
+            print(f"    ✓ LLM {field}: {len(llm_output[field])} chars")
         else:
             print(f"    ✗ LLM {field} missing or empty")
-except Exception as e:
-    print(f"    ✗ Failed: {e}")
-    import traceback
-    traceback.print_exc()
-    sys.exit(1)
+
 
 # Test 5: Quality Metrics
-print("\n[5/5] Quality Metrics")
-try:
-    metrics = assessment['quality_metrics']
-    
+def test_quality_metrics(predictor):
+    print("\n[5/5] Quality Metrics")
+    metrics = _generate_assessments(predictor)[0]['quality_metrics']
+
     print(f"    ✓ LLM Used: {metrics['llm_used']}")
     print(f"    ✓ Provider: {metrics['llm_provider']}")
     print(f"    ✓ Model: {metrics['llm_model']}")
     print(f"    ✓ Cached: {metrics['llm_cached']}")
     print(f"    ✓ Quality: {metrics['explanation_quality']}")
-except Exception as e:
-    print(f"    ✗ Failed: {e}")
-    sys.exit(1)
-
-# Final Summary
-print("\n" + "=" * 80)
-print("FINAL VERIFICATION RESULTS")
-print("=" * 80)
-
-print("\n✅ SYSTEM STATUS: OPERATIONAL")
-print("\nVerified Components:")
-print("  ✓ LLM Provider Integration (Groq/OpenAI)")
-print("  ✓ Explanation Cache System (SQLite)")
-print("  ✓ Prompt Templates (5 types)")
-print("  ✓ Configuration Management")
-print("  ✓ Risk Predictor Enhancement")
-print("  ✓ JSON Output Generation")
-print("  ✓ Quality Metrics Tracking")
-
-print("\nTest Results:")
-print("  ✓ [1/5] System Initialization - PASSED")
-print("  ✓ [2/5] LLM Methods Available - PASSED")
-print("  ✓ [3/5] JSON Output Generation - PASSED")
-print("  ✓ [4/5] LLM Explanations Present - PASSED")
-print("  ✓ [5/5] Quality Metrics Present - PASSED")
-
-print("\n" + "=" * 80)
-print("🎉 LLM INTEGRATION COMPLETE AND VERIFIED!")
-print("=" * 80)
-
-print("\nSystem is ready for:")
-print("  ✓ Streamlit frontend integration")
-print("  ✓ API endpoint deployment")
-print("  ✓ Production use")
-print("  ✓ User-facing applications")
-
-print("\nNext Steps:")
-print("  1. Configure .env with GROQ_API_KEY")
-print("  2. Test with actual VCF files")
-print("  3. Integrate with frontend (app.py)")
-print("  4. Deploy to production")
-print("  5. Monitor cache performance and API usage")
-
-print("\nDocumentation:")
-print("  • LLM_IMPLEMENTATION_SUMMARY.md - Quick reference")
-print("  • LLM_INTEGRATION_GUIDE.md - Complete guide")
-
-sys.exit(0)
+
+
+TESTS = [
+    test_system_initialization,
+    test_llm_explanation_methods,
+    test_json_output_generation,
+    test_llm_explanations_in_output,
+    test_quality_metrics,
+]
+
+
+def main():
+    """Run all verification steps, stopping at the first failure"""
+    # Buffer output and write it out once per test section instead of
+    # once per line when stdout is a terminal
+    sys.stdout.reconfigure(line_buffering=False)
+    print("=" * 80)
+    print("FINAL VERIFICATION TEST: LLM Integration System")
+    print("=" * 80)
+
+    # Build the predictor once and share it across every step
+    try:
+        predictor = get_risk_predictor()
+    except Exception as e:
+        print(f"    ✗ Failed: {e}")
+        return False
+    # Pass each step the fixtures it names, as pytest does
+    fixtures = {"predictor": predictor, "llm": predictor.llm_explainer}
+
+    for test in TESTS:
+        try:
+            test(**{name: fixtures[name] for name in signature(test).parameters})
+        except Exception as e:
+            print(f"    ✗ Failed: {e}")
+            sys.stdout.flush()
+            import traceback
+            traceback.print_exc()
+            return False
+        sys.stdout.flush()
+
+    # Final Summary
+    print("\n" + "=" * 80)
+    print("FINAL VERIFICATION RESULTS")
+    print("=" * 80)
+
+    print("\n✅ SYSTEM STATUS: OPERATIONAL")
+    print("\nVerified Components:")
+    print("  ✓ LLM Provider Integration (Groq/OpenAI)")
+    print("  ✓ Explanation Cache System (SQLite)")
+    print("  ✓ Prompt Templates (5 types)")
+    print("  ✓ Configuration Management")
+    print("  ✓ Risk Predictor Enhancement")
+    print("  ✓ JSON Output Generation")
+    print("  ✓ Quality Metrics Tracking")
+
+    print("\nTest Results:")
+    print("  ✓ [1/5] System Initialization - PASSED")
+    print("  ✓ [2/5] LLM Methods Available - PASSED")
+    print("  ✓ [3/5] JSON Output Generation - PASSED")
+    print("  ✓ [4/5] LLM Explanations Present - PASSED")
+    print("  ✓ [5/5] Quality Metrics Present - PASSED")
+
+    print("\n" + "=" * 80)
+    print("🎉 LLM INTEGRATION COMPLETE AND VERIFIED!")
+    print("=" * 80)
+
+    print("\nSystem is ready for:")
+    print("  ✓ Streamlit frontend integration")
+    print("  ✓ API endpoint deployment")
+    print("  ✓ Production use")
+    print("  ✓ User-facing applications")
+
+    print("\nNext Steps:")
+    print("  1. Configure .env with GROQ_API_KEY")
+    print("  2. Test with actual VCF files")
+    print("  3. Integrate with frontend (app.py)")
+    print("  4. Deploy to production")
+    print("  5. Monitor cache performance and API usage")
+
+    print("\nDocumentation:")
+    print("  • LLM_IMPLEMENTATION_SUMMARY.md - Quick reference")
+    print("  • LLM_INTEGRATION_GUIDE.md - Complete guide")
+    sys.stdout.flush()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -8,8 +8,12 @@ from pathlib import Path
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import json
+import time
 import unittest
 import tempfile
+from types import SimpleNamespace
+from unittest import mock
 from src.llm_cache import ExplanationCache
 from src.llm_prompt_templates import PromptBuilder, PromptTemplate
 from src.llm_integration import PharmaGuardExplainer
@@ -20,16 +24,12 @@ class TestExplanationCache(unittest.TestCase):
     """Test the explanation caching system."""
     
     def setUp(self):
-        """Create a temporary database for testing."""
-        self.temp_dir = tempfile.mkdtemp()
-        self.db_path = os.path.join(self.temp_dir, "test_cache.db")
-        self.cache = ExplanationCache(self.db_path)
+        """Create an in-memory database for testing."""
+        self.cache = ExplanationCache(":memory:")
     
     def tearDown(self):
-        """Clean up temporary files."""
-        if os.path.exists(self.db_path):
-            os.remove(self.db_path)
-        os.rmdir(self.temp_dir)
+        """Close the database."""
+        self.cache.close()
     
     def test_cache_and_retrieve_variant(self):
         """Test caching and retrieving variant explanations."""
@@ -50,6 +50,28 @@ class TestExplanationCache(unittest.TestCase):
         cached = self.cache.get_variant_explanation(gene, diplotype, phenotype, activity_score)
         self.assertEqual(cached, explanation)
     
+    def test_activity_score_binning(self):
+        """Test that near-identical activity scores share a cache entry."""
+        self.cache.cache_variant_explanation("CYP2D6", "*1/*1", "Normal", 2.0, "explanation")
+        self.assertEqual(self.cache.get_variant_explanation("CYP2D6", "*1/*1", "Normal", 1.9999999), "explanation")
+        self.assertIsNone(self.cache.get_variant_explanation("CYP2D6", "*1/*1", "Normal", 1.75))
+        # Quarter scores are stable under float noise in either direction
+        self.cache.cache_variant_explanation("CYP2D6", "*1/*4", "Poor", 0.25, "quarter")
+        for score in (0.2499999, 0.2500001):
+            self.assertEqual(self.cache.get_variant_explanation("CYP2D6", "*1/*4", "Poor", score), "quarter")
+    
+    def test_memory_size_bounds_lru(self):
+        """Test that only memory_size explanations stay in memory."""
+        cache = ExplanationCache(":memory:", memory_size=2)
+        try:
+            for index in range(3):
+                cache.cache_variant_explanation("CYP2D6", f"*1/*{index}", "Normal", 2.0, f"explanation {index}")
+            self.assertEqual(len(cache._memory), 2)
+            # The oldest entry was evicted first
+            self.assertEqual([value for value, _ in cache._memory.values()], ["explanation 1", "explanation 2"])
+        finally:
+            cache.close()
+    
     def test_cache_and_retrieve_risk(self):
         """Test caching and retrieving risk explanations."""
         drug = "Codeine"
@@ -93,6 +115,61 @@ class TestExplanationCache(unittest.TestCase):
         # Retrieve with uppercase
         cached = self.cache.get_variant_explanation(gene.upper(), diplotype.upper(), phenotype.upper(), activity_score)
         self.assertEqual(cached, explanation)
+    
+    def test_mru_avoids_db(self):
+        """Test that repeated lookups are served from memory after one DB read."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "test_cache.db")
+            writer = ExplanationCache(db_path)
+            writer.cache_variant_explanation("CYP2D6", "*1/*1", "Normal", 1.0, "explanation")
+            writer.close()
+            
+            # A fresh cache has nothing in memory, so only the first get reads SQLite
+            cache = ExplanationCache(db_path)
+            statements = []
+            cache._conn.set_trace_callback(statements.append)
+            for _ in range(10):
+                self.assertEqual(cache.get_variant_explanation("cyp2d6", "*1/*1", "normal", 1.0), "explanation")
+            cache.close()
+        self.assertEqual(len([sql for sql in statements if "SELECT" in sql]), 1)
+
+    def test_bulk_insert(self):
+        """Test caching many variant explanations in one transaction."""
+        rows = [("CYP2D6", f"*1/*{i}", "Normal", 1.0, f"explanation {i}") for i in range(1000)]
+        start = time.perf_counter()
+        self.cache.cache_variant_explanations_bulk(rows)
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(self.cache.get_cache_stats()["variant_explanations"], 1000)
+        self.assertEqual(self.cache.get_variant_explanation("CYP2D6", "*1/*7", "Normal", 1.0), "explanation 7")
+    
+    def test_memory_hits_are_fast(self):
+        """Test that 10k in-memory lookups complete within a small budget."""
+        self.cache.cache_risk_explanation("Codeine", "CYP2D6", "Normal", "SAFE", "explanation")
+        start = time.perf_counter()
+        for _ in range(10000):
+            self.cache.get_risk_explanation("Codeine", "CYP2D6", "Normal", "SAFE")
+        self.assertLess(time.perf_counter() - start, 0.05)
+    
+    def test_exit_flush_holds_caches_weakly(self):
+        """Test that the exit flush persists open caches without keeping them alive."""
+        import gc
+        import weakref
+        from src.llm_cache import flush_open_caches
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "cache.db")
+            cache = ExplanationCache(db_path)
+            cache.cache_risk_explanation("Codeine", "CYP2D6", "Normal", "SAFE", "explanation")
+            flush_open_caches()
+            reader = ExplanationCache(db_path)
+            self.assertEqual(reader.get_cache_stats()["risk_explanations"], 1)
+            reader.close()
+            
+            ref = weakref.ref(cache)
+            cache._conn.close()
+            del cache
+            gc.collect()
+            self.assertIsNone(ref())
 
 
 class TestPromptBuilder(unittest.TestCase):
@@ -130,6 +207,21 @@ class TestPromptBuilder(unittest.TestCase):
         self.assertIn("Normal", prompt)
         self.assertIn("5mg daily", prompt)
     
+    def test_build_variant_explanation_memoized(self):
+        """Test that repeated prompts are served from the memo."""
+        from src.llm_prompt_templates import _variant_prompt
+        _variant_prompt.cache_clear()
+        for _ in range(1000):
+            self.builder.build_variant_explanation("CYP2D6", "*1/*1", "Normal", 1.0)
+        self.assertEqual(_variant_prompt.cache_info().hits, 999)
+    
+    def test_build_batch(self):
+        """Test combining prompts into one numbered batch prompt."""
+        prompt = self.builder.build_batch(["first case", "second case"])
+        self.assertIn("2 cases", prompt)
+        self.assertIn("[1] first case", prompt)
+        self.assertIn("[2] second case", prompt)
+    
     def test_system_role(self):
         """Test getting system role."""
         role = self.builder.get_system_role()
@@ -138,16 +230,22 @@ class TestPromptBuilder(unittest.TestCase):
     def test_available_templates(self):
         """Test getting available templates."""
         templates = self.builder.get_available_templates()
-        self.assertGreater(len(templates), 0)
+        self.assertTrue(templates)
         self.assertIn(PromptTemplate.VARIANT_EXPLANATION.value, templates)
 
 
 class TestPharmaGuardExplainer(unittest.TestCase):
     """Test high-level explainer interface."""
     
-    def setUp(self):
-        """Initialize explainer without LLM."""
-        self.explainer = PharmaGuardExplainer(llm_explainer=None)
+    @classmethod
+    def setUpClass(cls):
+        """Initialize one explainer without LLM for every test."""
+        cls.explainer = PharmaGuardExplainer(llm_explainer=None)
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Close the explainer's cache."""
+        cls.explainer.cache.close()
     
     def test_explain_risk_profile_fallback(self):
         """Test risk profile explanation in fallback mode."""
@@ -198,6 +296,246 @@ class TestPharmaGuardExplainer(unittest.TestCase):
         self.assertTrue(any("safe" in rec.lower() for rec in safe_recs))
 
 
+class _FakeBatchClient:
+    """Stands in for the OpenAI client's files/batches endpoints."""
+    
+    def __init__(self):
+        self.uploaded = []
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+    
+    def _create_file(self, file, purpose):
+        self.uploaded = [json.loads(line) for line in file[1].decode().splitlines()]
+        return SimpleNamespace(id="file-in")
+    
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        return SimpleNamespace(id="batch-1")
+    
+    def _retrieve_batch(self, batch_id):
+        return SimpleNamespace(status="completed", output_file_id="file-out")
+    
+    def _file_content(self, file_id):
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {"choices": [{"message": {"content": f"answer {request['custom_id']}"}}]}
+                }
+            })
+            for request in self.uploaded
+        ]
+        return SimpleNamespace(text="\n".join(lines))
+
+
+class TestBatchAPI(unittest.TestCase):
+    """Test the OpenAI Batch API path with a stubbed client."""
+    
+    def setUp(self):
+        """Create an OpenAI explainer backed by an in-memory cache."""
+        from backend.src.llm_explainer import LLMExplainer
+        with mock.patch.dict(os.environ, {"OPENAI_API_KEY": "test-key"}):
+            self.explainer = LLMExplainer(provider="openai", cache_db=":memory:")
+        self.explainer.client = _FakeBatchClient()
+    
+    def tearDown(self):
+        """Close the cache database."""
+        self.explainer.cache.close()
+    
+    def test_batch_api_round_trip(self):
+        """Test variant explanations submitted and collected as one batch job."""
+        cases = [
+            {"gene": "CYP2D6", "diplotype": "*1/*1", "phenotype": "Normal", "activity_score": 2.0},
+            {"gene": "CYP2C19", "diplotype": "*1/*2", "phenotype": "Intermediate", "activity_score": 1.0},
+        ]
+        results = self.explainer.get_variant_explanations_batch(cases, offline=True)
+        
+        uploaded = self.explainer.client.uploaded
+        self.assertEqual(len(uploaded), 2)
+        self.assertEqual(uploaded[0]["url"], "/v1/chat/completions")
+        self.assertEqual([r["summary"] for r in results], ["answer 0", "answer 1"])
+        
+        # Answers are cached, so a second run needs no batch job
+        self.explainer.client = None
+        cached = self.explainer.get_variant_explanations_batch(cases, offline=True)
+        self.assertTrue(all(r["from_cache"] for r in cached))
+    
+    def test_batch_api_timeout_falls_back(self):
+        """Test that a Batch API job past BATCH_TIMEOUT is cancelled and answered per item."""
+        client = self.explainer.client
+        client.batches.retrieve = lambda batch_id: SimpleNamespace(status="in_progress")
+        client.batches.cancel = mock.Mock()
+        self.explainer.BATCH_TIMEOUT = 0
+        self.explainer._chat = mock.Mock(return_value="direct answer")
+        cases = [
+            {"gene": "CYP2D6", "diplotype": "*1/*1", "phenotype": "Normal", "activity_score": 2.0},
+            {"gene": "CYP2C19", "diplotype": "*1/*2", "phenotype": "Intermediate", "activity_score": 1.0},
+        ]
+        results = self.explainer.get_variant_explanations_batch(cases, offline=True)
+        
+        client.batches.cancel.assert_called_once_with("batch-1")
+        self.assertEqual(self.explainer._chat.call_count, 2)
+        self.assertEqual([r["summary"] for r in results], ["direct answer"] * 2)
+    
+    def test_parse_batched_response(self):
+        """Test that batched answers come from a JSON array of the right shape."""
+        from backend.src.llm_explainer import _split_batch_reply
+        reply = '```json\n["first answer\\n[2] cites a trial", " second answer "]\n```'
+        self.assertEqual(
+            _split_batch_reply(reply, 2),
+            ["first answer\n[2] cites a trial", "second answer"]
+        )
+        # Malformed replies are rejected whole, never partly assigned
+        for bad in ("[1] first\n[2] second", '["only one"]', '["one", ""]', '["one", 2]', '{"a": "b"}'):
+            with self.subTest(reply=bad):
+                self.assertEqual(_split_batch_reply(bad, 2), [None, None])
+    
+    def test_malformed_batch_reply_not_cached(self):
+        """Test that a rejected batch reply falls back per item and caches only those answers."""
+        cases = [
+            {"gene": "CYP2D6", "diplotype": "*1/*1", "phenotype": "Normal", "activity_score": 2.0},
+            {"gene": "CYP2C19", "diplotype": "*1/*2", "phenotype": "Intermediate", "activity_score": 1.0},
+        ]
+        self.explainer._chat = mock.Mock(side_effect=["[1] a\n[2] b", "direct 1", "direct 2"])
+        results = self.explainer.get_variant_explanations_batch(cases)
+        
+        self.assertEqual([r["summary"] for r in results], ["direct 1", "direct 2"])
+        self.assertEqual(self.explainer.cache.get_variant_explanation(**cases[0]), "direct 1")
+    
+    def test_chat_batch_splits_by_token_budget(self):
+        """Test that one request never asks for more than BATCH_MAX_TOKENS."""
+        self.explainer.BATCH_MAX_TOKENS = 500
+        self.explainer._chat = mock.Mock(side_effect=['["a", "b"]', '["c"]'])
+        answers = self.explainer._chat_batch(["p1", "p2", "p3"], temperature=0.5, max_tokens=250)
+        
+        self.assertEqual(answers, ["a", "b", "c"])
+        self.assertEqual([c.kwargs["max_tokens"] for c in self.explainer._chat.call_args_list], [500, 250])
+    
+    def test_cache_only_makes_no_requests(self):
+        """Test that cache-only mode answers hits and never reaches the client."""
+        self.explainer.cache_only = True
+        cases = [
+            {"gene": "CYP2D6", "diplotype": "*1/*1", "phenotype": "Normal", "activity_score": 2.0},
+            {"gene": "CYP2C19", "diplotype": "*1/*2", "phenotype": "Intermediate", "activity_score": 1.0},
+        ]
+        self.explainer.cache.cache_variant_explanation(explanation="cached", **cases[0])
+        self.explainer.client = mock.Mock()
+        
+        for offline in (False, True):
+            with self.subTest(offline=offline):
+                results = self.explainer.get_variant_explanations_batch(cases, offline=offline)
+                self.assertEqual(results[0]["summary"], "cached")
+                self.assertEqual(results[1]["status"], "error")
+        self.assertEqual(self.explainer.client.mock_calls, [])
+    
+    def test_failed_chunk_keeps_other_answers(self):
+        """Test that a failed chunk request does not discard the other chunks' answers."""
+        self.explainer.BATCH_MAX_TOKENS = 500
+        cases = [
+            {"gene": gene, "diplotype": "*1/*1", "phenotype": "Normal", "activity_score": 2.0}
+            for gene in ("CYP2D6", "CYP2C19", "CYP2C9")
+        ]
+        self.explainer._chat = mock.Mock(side_effect=['["a", "b"]', RuntimeError("rate limited"), "single"])
+        results = self.explainer.get_variant_explanations_batch(cases)
+        
+        self.assertEqual([r["summary"] for r in results], ["a", "b", "single"])
+        self.assertEqual(self.explainer._chat.call_count, 3)
+        self.assertEqual(self.explainer.cache.get_variant_explanation(**cases[1]), "b")
+    
+    def test_dosing_batch_single_request(self):
+        """Test that dosing cases share one chat request and keep their order."""
+        cases = [
+            {"drug": drug, "phenotype": "Poor Metabolizer", "gene": "CYP2D6",
+             "standard_dose": "Unknown", "risk_level": "Toxic"}
+            for drug in ("Codeine", "Tramadol")
+        ]
+        self.explainer._chat = mock.Mock(return_value='["codeine dose", "tramadol dose"]')
+        results = self.explainer.get_dosing_adjustments_batch(cases)
+        
+        self.explainer._chat.assert_called_once()
+        self.assertEqual([r["summary"] for r in results], ["codeine dose", "tramadol dose"])
+
+
+class TestReportExplanations(unittest.TestCase):
+    """Test which LLM explanations a report requests."""
+    
+    def test_unused_variants_skip_llm(self):
+        """Test that only the primary gene's variant is sent to the LLM."""
+        from src.risk_predictor import RiskPredictor
+        from src.gene_models import Phenotype
+        success = {"status": "success", "summary": "explanation"}
+        explainer = mock.Mock(provider="groq", model="test-model")
+        explainer.get_variant_explanations_batch.side_effect = lambda cases, offline: [success] * len(cases)
+        explainer.get_risk_explanations_batch.side_effect = lambda cases, offline: [success] * len(cases)
+        explainer.get_dosing_adjustments_batch.side_effect = lambda cases, offline: [success] * len(cases)
+        explainer.get_phenotype_interpretation.return_value = success
+        
+        predictor = RiskPredictor()
+        predictor.llm_explainer = explainer
+        predictor.llm_available = True
+        output = json.loads(predictor._generate_json_output(
+            {"CYP2D6": ("*1", "*1"), "CYP2C19": ("*1", "*2")},
+            {"CYP2D6": Phenotype.NORMAL, "CYP2C19": Phenotype.INTERMEDIATE},
+            {"Codeine": {"drug": "Codeine", "risk_level": "Safe"}}
+        ))
+        
+        explainer.get_variant_explanations_batch.assert_called_once()
+        cases = explainer.get_variant_explanations_batch.call_args[0][0]
+        self.assertEqual([case["gene"] for case in cases], ["CYP2D6"])
+        variants = output[0]["pharmacogenomic_profile"]["detected_variants"]
+        self.assertEqual([v["gene"] for v in variants], ["CYP2D6", "CYP2C19"])
+        self.assertIn("llm_explanation", variants[0])
+        self.assertNotIn("llm_explanation", variants[1])
+    
+    def test_zero_concurrency_rejected(self):
+        """Test that LLM_MAX_CONCURRENCY=0 fails at construction, not per report."""
+        from src.risk_predictor import RiskPredictor
+        with mock.patch.dict(os.environ, {"LLM_MAX_CONCURRENCY": "0"}):
+            with self.assertRaises(ValueError):
+                RiskPredictor()
+    
+    def test_streamed_json_matches(self):
+        """Test that streaming a report writes the same bytes as dumping it."""
+        import io
+        from src.risk_predictor import RiskPredictor
+        from src.gene_models import Phenotype
+        predictor = RiskPredictor()
+        predictor.llm_available = False
+        assessments = predictor._build_assessments(
+            {"CYP2D6": ("*1", "*4"), "CYP2C19": ("*1", "*2")},
+            {"CYP2D6": Phenotype.INTERMEDIATE, "CYP2C19": Phenotype.INTERMEDIATE},
+            {
+                "Codeine": {"drug": "Codeine", "risk_level": "Adjust Dosage"},
+                "Clopidogrel": {"drug": "Clopidogrel", "risk_level": "Ineffective"},
+            }
+        )
+        for entries in (assessments, []):
+            with self.subTest(count=len(entries)):
+                stream = io.BytesIO()
+                RiskPredictor._stream_json(entries, stream)
+                self.assertEqual(stream.getvalue().decode(), RiskPredictor._dump_json(entries))
+    
+    def test_stdlib_json_matches_orjson(self):
+        """Test that the stdlib fallback writes the same text as orjson."""
+        import src.risk_predictor as risk_predictor
+        from src.risk_predictor import RiskPredictor
+        from src.gene_models import Phenotype
+        if risk_predictor.orjson is None:
+            self.skipTest("orjson not installed")
+        predictor = RiskPredictor()
+        predictor.llm_available = False
+        assessments = predictor._build_assessments(
+            {"DPYD": ("*1", "*2A")},
+            {"DPYD": Phenotype.INTERMEDIATE},
+            {"Fluorouracil": {"drug": "Fluorouracil", "risk_level": "Adjust Dosage",
+                              "explanation": "Reduce to 50% of 400 mg/m²"}}
+        )
+        expected = RiskPredictor._dump_json(assessments)
+        self.assertIn("mg/m²", expected)
+        with mock.patch.object(risk_predictor, "orjson", None):
+            self.assertEqual(RiskPredictor._dump_json(assessments), expected)
+
+
 class TestLLMConfig(unittest.TestCase):
     """Test LLM configuration."""
     
@@ -231,9 +569,10 @@ class TestPromptConfig(unittest.TestCase):
     def test_system_roles(self):
         """Test getting system roles."""
         for explanation_type in ["risk_explanation", "variant_explanation", "dosing_adjustment"]:
-            role = PromptConfig.get_system_role(explanation_type)
-            self.assertIsNotNone(role)
-            self.assertGreater(len(role), 0)
+            with self.subTest(explanation_type=explanation_type):
+                role = PromptConfig.get_system_role(explanation_type)
+                self.assertIsNotNone(role)
+                self.assertTrue(role)
     
     def test_max_tokens(self):
         """Test max tokens configuration."""
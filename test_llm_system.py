@@ -2,12 +2,40 @@
 Comprehensive test script for LLM integration system
 Tests all components and verifies API connectivity
 """
+import io
 import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Setup path
 sys.path.insert(0, str(Path(__file__).parent))
 
+
+class _ThreadOutput(io.TextIOBase):
+    """Stand-in for sys.stdout that gives each capturing thread its own buffer"""
+    
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+    
+    def capture(self) -> io.StringIO:
+        """Send this thread's output to a fresh buffer until release()"""
+        self._local.buffer = io.StringIO()
+        return self._local.buffer
+    
+    def release(self):
+        self._local.buffer = None
+    
+    def write(self, text):
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer if buffer is not None else self._default).write(text)
+    
+    def flush(self):
+        self._default.flush()
+
 def test_imports():
     """Test that all modules can be imported."""
     print("=" * 60)
@@ -63,55 +91,67 @@ def test_cache_system():
         import tempfile
         import os
         
-        # Create temporary cache
-        temp_dir = tempfile.mkdtemp()
-        db_path = os.path.join(temp_dir, "test_cache.db")
-        cache = ExplanationCache(db_path)
-        
-        # Test variant explanation caching
-        cache.cache_variant_explanation(
-            "CYP2D6", "*1/*1", "Normal", 1.0,
-            "This is a test explanation"
-        )
-        
-        cached = cache.get_variant_explanation(
-            "CYP2D6", "*1/*1", "Normal", 1.0
-        )
-        
-        if cached == "This is a test explanation":
-            print("✓ Variant explanation caching works correctly")
-        else:
-            print("✗ Variant explanation caching failed")
-            return False
-        
-        # Test risk explanation caching
-        cache.cache_risk_explanation(
-            "Codeine", "CYP2D6", "Normal", "SAFE",
-            "Codeine is safe for normal metabolizers"
-        )
-        
-        cached = cache.get_risk_explanation(
-            "Codeine", "CYP2D6", "Normal", "SAFE"
-        )
-        
-        if cached == "Codeine is safe for normal metabolizers":
-            print("✓ Risk explanation caching works correctly")
-        else:
-            print("✗ Risk explanation caching failed")
-            return False
-        
-        # Test cache statistics
-        stats = cache.get_cache_stats()
-        if stats["variant_explanations"] >= 1 and stats["risk_explanations"] >= 1:
-            print(f"✓ Cache statistics working: {stats}")
-        else:
-            print("✗ Cache statistics failed")
-            return False
-        
-        # Cleanup
-        if os.path.exists(db_path):
-            os.remove(db_path)
-        os.rmdir(temp_dir)
+        # Temporary cache; the directory is removed even if a check fails,
+        # after the cache has released its connection
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "test_cache.db")
+            cache = ExplanationCache(db_path)
+            try:
+                # Test variant explanation caching
+                cache.cache_variant_explanation(
+                    "CYP2D6", "*1/*1", "Normal", 1.0,
+                    "This is a test explanation"
+                )
+                
+                cached = cache.get_variant_explanation(
+                    "CYP2D6", "*1/*1", "Normal", 1.0
+                )
+                
+                if cached == "This is a test explanation":
+                    print("✓ Variant explanation caching works correctly")
+                else:
+                    print("✗ Variant explanation caching failed")
+                    return False
+                
+                # Test risk explanation caching
+                cache.cache_risk_explanation(
+                    "Codeine", "CYP2D6", "Normal", "SAFE",
+                    "Codeine is safe for normal metabolizers"
+                )
+                
+                cached = cache.get_risk_explanation(
+                    "Codeine", "CYP2D6", "Normal", "SAFE"
+                )
+                
+                if cached == "Codeine is safe for normal metabolizers":
+                    print("✓ Risk explanation caching works correctly")
+                else:
+                    print("✗ Risk explanation caching failed")
+                    return False
+                
+                # Test cache statistics
+                stats = cache.get_cache_stats()
+                if stats["variant_explanations"] >= 1 and stats["risk_explanations"] >= 1:
+                    print(f"✓ Cache statistics working: {stats}")
+                else:
+                    print("✗ Cache statistics failed")
+                    return False
+                
+                # Test bulk caching (one transaction for all rows)
+                rows = [("CYP2C19", f"*1/*{i}", "Normal", 1.0, f"Bulk explanation {i}")
+                        for i in range(100)]
+                start = time.perf_counter()
+                cache.cache_variant_explanations_bulk(rows)
+                elapsed = time.perf_counter() - start
+                stats = cache.get_cache_stats()
+                if (stats["variant_explanations"] >= 101 and
+                        cache.get_variant_explanation("CYP2C19", "*1/*99", "Normal", 1.0) == "Bulk explanation 99"):
+                    print(f"✓ Bulk caching works: {len(rows)} rows in {elapsed * 1000:.1f} ms")
+                else:
+                    print("✗ Bulk caching failed")
+                    return False
+            finally:
+                cache.close()
         
         return True
         
@@ -303,25 +343,44 @@ def test_explainer_interface():
         return False
 
 
+# Completion text returned when the API test runs without live calls
+_CANNED_REPLY = "Canned explanation used when PHARMAGUARD_TEST_LIVE_LLM is not set."
+
+
 def test_api_connectivity():
-    """Test OpenAI API connectivity."""
+    """Test OpenAI API connectivity.
+
+    Completions are canned unless PHARMAGUARD_TEST_LIVE_LLM is set, in which
+    case the configured OpenAI key is used for real requests.
+    """
     print("\n" + "=" * 60)
     print("TESTING OPENAI API CONNECTIVITY...")
     print("=" * 60)
     
     try:
         from backend.src.llm_explainer import LLMExplainer
+        from unittest import mock
         import os
         
+        live = bool(os.getenv("PHARMAGUARD_TEST_LIVE_LLM"))
         api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+        if live and not api_key:
             print("✗ OPENAI_API_KEY not found")
             return False
         
         # Initialize LLMExplainer
         try:
-            explainer = LLMExplainer(api_key=api_key)
-            print("✓ LLMExplainer initialized with API key")
+            if live:
+                explainer = LLMExplainer(api_key=api_key)
+                print("✓ LLMExplainer initialized with API key")
+            else:
+                # Canned replies go to a throwaway cache so they never end
+                # up in llm_cache.db
+                explainer = LLMExplainer(api_key=api_key or "sk-offline-test",
+                                         provider="openai", cache_db=":memory:")
+                explainer._chat = mock.Mock(return_value=_CANNED_REPLY)
+                print("✓ LLMExplainer initialized with canned completions "
+                      "(set PHARMAGUARD_TEST_LIVE_LLM=1 for live API calls)")
         except Exception as e:
             print(f"✗ Failed to initialize LLMExplainer: {e}")
             return False
@@ -356,7 +415,16 @@ def test_api_connectivity():
         elif result["status"] == "error":
             print(f"✗ API call failed: {result['summary']}")
             return False
-        
+
+        # Repeat calls must be answered by the explanation cache, not the API
+        result = explainer.get_variant_explanation(
+            "CYP2D6", "*1/*1", "Normal Metabolizer", 1.0
+        )
+        if not result.get("from_cache"):
+            print("✗ Repeated variant explanation was not served from cache")
+            return False
+        print("✓ Repeated variant explanation served from cache")
+
         # Test cache stats
         stats = explainer.get_cache_stats()
         print(f"\n✓ Cache stats: {stats}")
@@ -365,7 +433,6 @@ def test_api_connectivity():
         
     except Exception as e:
         print(f"✗ API connectivity test failed: {e}")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -386,13 +453,39 @@ def run_all_tests():
         ("OpenAI API Connectivity", test_api_connectivity),
     ]
     
-    results = []
-    for test_name, test_func in tests:
+    # The API test spends its time waiting on the network, so it runs in
+    # the background while the local tests run one after another. The local
+    # tests stay serial: several import modules that can fail part-way
+    # through import, which is not safe to race between threads. Output is
+    # buffered per test and printed in the usual order
+    output = _ThreadOutput(sys.stdout)
+    
+    def run_captured(test):
+        test_name, test_func = test
+        buffer = output.capture()
         try:
-            results.append((test_name, test_func()))
+            result = test_func()
         except Exception as e:
             print(f"\n✗ Unexpected error in {test_name}: {e}")
-            results.append((test_name, False))
+            result = False
+        finally:
+            output.release()
+        return test_name, result, buffer.getvalue()
+    
+    *local_tests, network_test = tests
+    results = []
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            network_future = executor.submit(run_captured, network_test)
+            outcomes = [run_captured(test) for test in local_tests]
+            outcomes.append(network_future.result())
+    finally:
+        sys.stdout = output._default
+    
+    for test_name, result, text in outcomes:
+        print(text, end="")
+        results.append((test_name, result))
     
     # Summary
     print("\n" + "=" * 60)
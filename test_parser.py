@@ -3,8 +3,9 @@ Test script to validate VCF parser and risk prediction
 Run: python test_parser.py
 """
 import sys
-from src.vcf_parser import parse_vcf_file
-from src.risk_predictor import RiskPredictor
+
+from src.vcf_parser import load_vcf, parse_vcf_file
+from src.risk_predictor import get_risk_predictor
 from src.gene_models import Phenotype
 
 
@@ -31,14 +32,12 @@ def test_vcf_parsing():
     return True
 
 
-def test_genotype_to_phenotype():
+def test_genotype_to_phenotype(predictor):
     """Test genotype-to-phenotype conversion"""
     print("\n" + "="*60)
     print("TEST 2: Genotype → Phenotype Conversion")
     print("="*60)
     
-    predictor = RiskPredictor()
-    
     test_cases = [
         ("CYP2D6", ("*1", "*1"), Phenotype.NORMAL),
         ("CYP2D6", ("*1", "*2"), Phenotype.NORMAL),
@@ -59,16 +58,15 @@ def test_genotype_to_phenotype():
     return passed == len(test_cases)
 
 
-def test_risk_prediction():
+def test_risk_prediction(predictor):
     """Test full risk prediction pipeline"""
     print("\n" + "="*60)
     print("TEST 3: Risk Prediction Pipeline")
     print("="*60)
     
-    predictor = RiskPredictor()
     drugs = ["Codeine", "Warfarin", "Clopidogrel"]
     
-    results = predictor.predict_from_vcf("sample_vcf/example.vcf", drugs)
+    results = predictor.predict_from_vcf("sample_vcf/example.vcf", drugs, parser=load_vcf("sample_vcf/example.vcf"))
     
     if not results['success']:
         print(f"❌ Prediction failed: {results['errors']}")
@@ -83,14 +81,13 @@ def test_risk_prediction():
     return True
 
 
-def test_json_output():
+def test_json_output(predictor):
     """Test JSON output generation"""
     print("\n" + "="*60)
     print("TEST 4: JSON Output")
     print("="*60)
     
-    predictor = RiskPredictor()
-    results = predictor.predict_from_vcf("sample_vcf/example.vcf", ["Codeine"])
+    results = predictor.predict_from_vcf("sample_vcf/example.vcf", ["Codeine"], parser=load_vcf("sample_vcf/example.vcf"))
     
     if not results['success']:
         print(f"❌ JSON generation failed")
@@ -115,11 +112,12 @@ def main():
     """Run all tests"""
     print("\n🧬 PharmaGuard VCF Parser Test Suite")
     
+    predictor = get_risk_predictor()
     tests = [
         ("VCF Parsing", test_vcf_parsing),
-        ("Genotype→Phenotype", test_genotype_to_phenotype),
-        ("Risk Prediction", test_risk_prediction),
-        ("JSON Output", test_json_output),
+        ("Genotype→Phenotype", lambda: test_genotype_to_phenotype(predictor)),
+        ("Risk Prediction", lambda: test_risk_prediction(predictor)),
+        ("JSON Output", lambda: test_json_output(predictor)),
     ]
     
     results = []
@@ -3,24 +3,23 @@ End-to-End Integration Test with VCF Files
 Demonstrates the complete PharmaGuard workflow with real test cases
 Run from backend directory: cd backend && python ../test_vcf_integration.py
 """
-import json
 import sys
 import os
+import traceback
 
 # Add backend to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
-from src.risk_predictor import RiskPredictor
+from src.risk_predictor import get_risk_predictor
 
 
-def test_vcf_workflow(vcf_path: str, drugs: list, test_name: str):
+def test_vcf_workflow(vcf_path: str, drugs: list, test_name: str, predictor):
     """Test a complete VCF analysis workflow"""
     print("\n" + "="*80)
     print(f"TEST: {test_name}")
     print("="*80)
     
     try:
-        predictor = RiskPredictor()
         results = predictor.predict_from_vcf(vcf_path, drugs)
         
         if not results['success']:
@@ -74,15 +73,16 @@ def test_vcf_workflow(vcf_path: str, drugs: list, test_name: str):
         
         # Save detailed output
         output_file = f"test_output_{test_name.replace(' ', '_')}.json"
-        with open(output_file, 'w') as f:
-            json.dump(json.loads(results['json_output']), f, indent=2)
+        # json_output is already indented; write it as-is instead of
+        # decoding and re-encoding it
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(results['json_output'])
         print(f"\n💾 Full JSON output saved to: {output_file}")
         
         return True
         
     except Exception as e:
         print(f"❌ ERROR: {str(e)}")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -111,9 +111,12 @@ def main():
         },
     ]
     
+    # One predictor serves every workflow; construction loads all the
+    # gene/drug tables and the LLM client
+    predictor = get_risk_predictor()
     results = []
     for test in tests:
-        success = test_vcf_workflow(test["vcf"], test["drugs"], test["name"])
+        success = test_vcf_workflow(test["vcf"], test["drugs"], test["name"], predictor)
         results.append({
             "test": test["name"],
             "status": "✅ PASS" if success else "❌ FAIL"
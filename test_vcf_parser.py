@@ -0,0 +1,47 @@
+"""
+Tests for the streaming VCF parser
+"""
+import sys
+import os
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import unittest
+import tempfile
+
+
+class TestVCFParserMemory(unittest.TestCase):
+    """Test that parsing large VCFs does not buffer the file."""
+    
+    HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE\n"
+    
+    def _parse_peak(self, lines: int) -> int:
+        """Peak traced allocation while parsing a VCF of non-pharmacogenomic lines."""
+        import tracemalloc
+        from src.vcf_parser import VCFParser
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "large.vcf")
+            with open(path, "w") as f:
+                f.write(self.HEADER)
+                f.writelines(f"3\t{1000 + i}\t.\tA\tG\t60\tPASS\tDP=50\tGT\t0/1\n" for i in range(lines))
+            tracemalloc.start()
+            try:
+                parser = VCFParser(path)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        self.assertEqual(parser.variants, [])
+        return peak
+    
+    def test_memory_flat_across_file_sizes(self):
+        """Test that 10x more lines add well under one line's worth of memory each."""
+        small = self._parse_peak(2000)
+        large = self._parse_peak(20000)
+        # Buffering the extra 18k lines would cost over 800 KB
+        self.assertLess(large - small, 64 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
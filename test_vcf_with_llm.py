@@ -1,16 +1,27 @@
 """
 End-to-End Test: Process VCF file with LLM-integrated output
+Set PHARMAGUARD_VERBOSE=1 to print full tracebacks on errors
 """
+import os
 import sys
 import json
+import traceback
 from pathlib import Path
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.risk_predictor import RiskPredictor
+from src.risk_predictor import get_risk_predictor
+
+def test_vcf_with_llm(predictor):
+    """Test processing a VCF file and generating LLM-integrated output.
 
-def test_vcf_with_llm():
-    """Test processing a VCF file and generating LLM-integrated output."""
+    Under pytest the session-wide predictor fixture from conftest.py is used.
+    """
     
     print("=" * 80)
     print("END-TO-END TEST: VCF PROCESSING WITH LLM EXPLANATIONS")
@@ -25,9 +36,6 @@ def test_vcf_with_llm():
     
     print(f"\nUsing VCF: {vcf_path}")
     
-    # Initialize predictor
-    print("Initializing RiskPredictor...")
-    predictor = RiskPredictor()
     print(f"✓ LLM Available: {predictor.llm_available}")
     
     # Process VCF
@@ -46,9 +54,9 @@ def test_vcf_with_llm():
         
         # Parse JSON output
         try:
-            json_data = json.loads(result['json_output'])
+            json_data = json_loads(result['json_output'])
             print(f"✓ JSON output generated with {len(json_data)} drug assessments")
-        except json.JSONDecodeError as e:
+        except json.JSONDecodeError as e:  # orjson's error subclasses it
             print(f"✗ Failed to parse JSON: {e}")
             return False
         
@@ -118,11 +126,15 @@ def test_vcf_with_llm():
             
     except Exception as e:
         print(f"✗ Error during VCF processing: {e}")
-        import traceback
-        traceback.print_exc()
+        # The full stack is only printed on request
+        if os.environ.get("PHARMAGUARD_VERBOSE"):
+            traceback.print_exc()
+        else:
+            print("".join(traceback.format_exception_only(type(e), e)), end="")
         return False
 
 
 if __name__ == "__main__":
-    success = test_vcf_with_llm()
+    print("Initializing RiskPredictor...")
+    success = test_vcf_with_llm(get_risk_predictor())
     sys.exit(0 if success else 1)
@@ -1,13 +1,74 @@
 """
 Comprehensive System Verification & Diagnostics
 Checks all connections, APIs, databases, and core functionality
+Run: python verify_all_systems.py [--fast]
+  --fast  make no LLM requests: skip the Groq probe and answer explanations
+          from the existing cache (rule-based text on a miss)
+Set PHARMAGUARD_FAST_EXIT=1 to exit without interpreter cleanup (CI)
 """
+import argparse
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-import json
+from types import MappingProxyType
 import traceback
 
+from dotenv import load_dotenv
+
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    import json
+    from json import loads as json_loads
+    
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+parser = argparse.ArgumentParser(description="Verify every PharmaGuard subsystem")
+parser.add_argument("--fast", action="store_true",
+                    help="make no LLM requests; use cached explanations only")
+args = parser.parse_args()
+if args.fast:
+    # The explainer still serves cached explanations; anything that would
+    # need a request falls back to the rule-based text
+    os.environ["PHARMAGUARD_CACHE_ONLY"] = "1"
+
+# Machine-readable copy of the results, written at the end for CI
+RESULTS_FILE = Path("verify_results.json")
+
+# Read-only drug risk records for the workflow integration check; two
+# drugs so their explanations go through the batched LLM requests
+SAMPLE_DRUG_RISKS = MappingProxyType({
+    "Codeine": MappingProxyType({
+        "drug": "Codeine",
+        "risk_level": "Toxic",
+        "explanation": "Test",
+        "dosing_recommendation": "Avoid",
+        "monitoring": "Monitor",
+        "cpic_level": "1A",
+        "strength": "Strong",
+        "clinical_guidance": "Test",
+        "reference": "Test"
+    }),
+    "Tramadol": MappingProxyType({
+        "drug": "Tramadol",
+        "risk_level": "Toxic",
+        "explanation": "Test",
+        "dosing_recommendation": "Avoid",
+        "monitoring": "Monitor",
+        "cpic_level": "1A",
+        "strength": "Strong",
+        "clinical_guidance": "Test",
+        "reference": "Test"
+    })
+})
+
+# Read .env once, before any check (or the background Groq probe) looks
+# at the environment
+load_dotenv()
+
 print("\n" + "="*90)
 print("🔍 COMPREHENSIVE SYSTEM VERIFICATION & DIAGNOSTICS")
 print("="*90)
@@ -24,12 +85,12 @@ def check(name, test_func):
     try:
         test_func()
         results["passed"].append(name)
-        print(f"  ✅ {name}")
+        sys.stdout.write(f"  ✅ {name}\n")
         return True
     except Exception as e:
-        results["failed"].append((name, str(e)))
-        print(f"  ❌ {name}")
-        print(f"     Error: {str(e)[:100]}")
+        message = str(e)
+        results["failed"].append((name, message))
+        sys.stdout.write(f"  ❌ {name}\n     Error: {message[:100]}\n")
         return False
 
 def warn(name, message):
@@ -37,6 +98,34 @@ def warn(name, message):
     results["warnings"].append((name, message))
     print(f"  ⚠️  {name}: {message}")
 
+@lru_cache(maxsize=None)
+def _predict(vcf_file, drugs, as_json=False):
+    """Analyse a VCF once per (file, drugs, as_json); drugs is a tuple"""
+    from src.risk_predictor import get_risk_predictor
+    return get_risk_predictor().predict_from_vcf(vcf_file, list(drugs), as_json=as_json)
+
+def _probe_groq():
+    """Send a minimal completion to Groq and return the lines to report"""
+    from groq import Groq
+    
+    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    
+    # Test with simple completion; one token is enough to prove a reply
+    message = client.chat.completions.create(
+        messages=[{"role": "user", "content": "test"}],
+        model="llama-3.3-70b-versatile",
+        max_tokens=1
+    )
+    
+    assert message.choices[0].message.content, "No response from Groq"
+    return ["       Model: llama-3.3-70b-versatile", "       Response: OK"]
+
+# The Groq round-trip is the slow step of this script and depends on no
+# check; start it now so it overlaps the environment and import checks,
+# and report it in its own section
+if not args.fast:
+    _groq_probe = ThreadPoolExecutor(max_workers=1).submit(_probe_groq)
+
 # ============================================================================
 # 1. ENVIRONMENT & CONFIGURATION
 # ============================================================================
@@ -59,9 +148,6 @@ check("Environment file (.env) exists", check_env_file)
 
 def check_env_vars():
     """Check environment variables are loaded"""
-    from dotenv import load_dotenv
-    load_dotenv()
-    
     groq_key = os.getenv("GROQ_API_KEY")
     assert groq_key, "GROQ_API_KEY not found in environment"
     assert len(groq_key) > 10, "GROQ_API_KEY appears invalid (too short)"
@@ -124,9 +210,6 @@ print("\n[3/10] GROQ API CONNECTION")
 
 def check_groq_key():
     """Verify Groq API key exists"""
-    from dotenv import load_dotenv
-    load_dotenv()
-    
     groq_key = os.getenv("GROQ_API_KEY")
     assert groq_key, "GROQ_API_KEY not set"
     print(f"       Key found: {groq_key[:20]}...{groq_key[-10:]}")
@@ -135,30 +218,18 @@ check("Groq API key configured", check_groq_key)
 
 def check_groq_connection():
     """Test connection to Groq API"""
-    from groq import Groq
-    from dotenv import load_dotenv
-    
-    load_dotenv()
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    
-    # Test with simple completion
-    message = client.chat.completions.create(
-        messages=[{"role": "user", "content": "test"}],
-        model="llama-3.3-70b-versatile",
-        max_tokens=10
-    )
-    
-    assert message.choices[0].message.content, "No response from Groq"
-    print(f"       Model: llama-3.3-70b-versatile")
-    print(f"       Response: OK")
+    for line in _groq_probe.result():
+        print(line)
 
-check("Groq API connection test", check_groq_connection)
+if args.fast:
+    warn("Groq API connection test", "skipped (--fast)")
+else:
+    check("Groq API connection test", check_groq_connection)
 
 def check_llm_explainer():
     """Check LLM explainer is working"""
-    from src.risk_predictor import RiskPredictor
-    
-    predictor = RiskPredictor()
+    from src.risk_predictor import get_risk_predictor
+    predictor = get_risk_predictor()
     assert predictor.llm_available, "LLM not available"
     assert predictor.llm_explainer, "LLM explainer not initialized"
     
@@ -182,14 +253,15 @@ def check_cache_db():
     """Check cache database"""
     from src.llm_cache import ExplanationCache
     
+    # This check is about the on-disk database the app uses, so it is not
+    # swapped for ":memory:"; the probe is read-only and the connection is
+    # released straight away
     cache = ExplanationCache()
-    
-    # Test cache operations
-    test_key = "TEST_VARIANT"
-    test_value = "Test explanation"
-    
-    # Try to get from cache (will be None first time)
-    result = cache.get_variant_explanation("TEST", "*1/*1", "Normal", 1.0)
+    try:
+        # Try to get from cache (will be None first time)
+        cache.get_variant_explanation("TEST", "*1/*1", "Normal", 1.0)
+    finally:
+        cache.close()
     
     print(f"       Database: llm_cache.db")
     print(f"       Status: Ready")
@@ -221,7 +293,10 @@ def check_vcf_files():
     vcf_dir = Path("sample_vcf")
     assert vcf_dir.exists(), "sample_vcf directory not found"
     
-    vcf_files = list(vcf_dir.glob("*.vcf"))
+    # DirEntry.is_file() uses the type from the directory listing and
+    # stat() is cached on the entry
+    with os.scandir(vcf_dir) as entries:
+        vcf_files = [e for e in entries if e.name.endswith(".vcf") and e.is_file()]
     assert len(vcf_files) > 0, "No VCF files found"
     
     for vcf in vcf_files:
@@ -239,10 +314,7 @@ def check_source_files():
         "backend/src/llm_explainer.py",
     ]
     
-    missing = []
-    for file in required_files:
-        if not Path(file).exists():
-            missing.append(file)
+    missing = [file for file in required_files if not os.path.exists(file)]
     
     if missing:
         raise FileNotFoundError(f"Missing: {', '.join(missing)}")
@@ -276,13 +348,10 @@ print("\n[6/10] API ENDPOINTS")
 
 def check_api_endpoints():
     """Check API endpoints are defined"""
-    from api import app
+    from api import app, _meta
     
-    endpoints = {}
-    for route in app.routes:
-        if hasattr(route, 'path'):
-            if hasattr(route, 'methods'):
-                endpoints[route.path] = list(route.methods)
+    # Route metadata is cached by api._meta; mounts have no methods
+    endpoints = {path: methods for path, methods in map(_meta, app.routes) if methods}
     
     required = ['/health', '/upload', '/analyze']
     missing = [ep for ep in required if ep not in endpoints]
@@ -290,9 +359,10 @@ def check_api_endpoints():
     if missing:
         raise Exception(f"Missing endpoints: {missing}")
     
-    for ep, methods in sorted(endpoints.items()):
-        if '/results' in ep or any(ep.startswith(r) for r in required + ['/results', '/']):
-            print(f"       {ep}: {', '.join(methods)}")
+    # Every route path starts with '/', so every endpoint is listed
+    # Paths are unique, so sorting the keys alone gives the same order
+    for ep in sorted(endpoints):
+        print(f"       {ep}: {', '.join(sorted(endpoints[ep]))}")
 
 check("API endpoints defined", check_api_endpoints)
 
@@ -319,14 +389,11 @@ print("\n[7/10] VCF PROCESSING")
 
 def check_vcf_parser():
     """Test VCF parsing"""
-    from src.risk_predictor import RiskPredictor
-    
-    predictor = RiskPredictor()
     vcf_file = "sample_vcf/comprehensive_test.vcf"
     
     assert Path(vcf_file).exists(), f"Test VCF not found: {vcf_file}"
     
-    result = predictor.predict_from_vcf(vcf_file, ["Codeine"])
+    result = _predict(vcf_file, ("Codeine",))
     assert result is not None, "VCF processing returned None"
     assert result.get('success'), "VCF processing failed"
     
@@ -337,18 +404,12 @@ check("VCF file parsing", check_vcf_parser)
 
 def check_risk_prediction():
     """Test risk prediction"""
-    from src.risk_predictor import RiskPredictor
-    
-    predictor = RiskPredictor()
-    result = predictor.predict_from_vcf(
-        "sample_vcf/warfarin_dose.vcf",
-        ["Warfarin"]
-    )
+    result = _predict("sample_vcf/warfarin_dose.vcf", ("Warfarin",), as_json=True)
     
     assert result['success'], "Prediction failed"
     assert 'json_output' in result, "No JSON output"
     
-    json_data = json.loads(result['json_output'])
+    json_data = json_loads(result['json_output'])
     assert len(json_data) > 0, "No predictions returned"
     
     print(f"       Predictions: {len(json_data)} drug(s)")
@@ -363,17 +424,8 @@ print("\n[8/10] LLM EXPLANATIONS")
 
 def check_llm_explanations():
     """Check LLM explanations are generating"""
-    from src.risk_predictor import RiskPredictor
-    import json
-    
-    predictor = RiskPredictor()
-    result = predictor.predict_from_vcf(
-        "sample_vcf/codeine_risk.vcf",
-        ["Codeine"]
-    )
-    
-    json_data = json.loads(result['json_output'])
-    assessment = json_data[0]
+    result = _predict("sample_vcf/codeine_risk.vcf", ("Codeine",))
+    assessment = result['assessments'][0]
     
     llm = assessment.get('llm_generated_explanation', {})
     metrics = assessment.get('quality_metrics', {})
@@ -392,17 +444,9 @@ check("LLM explanation generation", check_llm_explanations)
 
 def check_quality_metrics():
     """Check quality metrics are tracked"""
-    from src.risk_predictor import RiskPredictor
-    import json
-    
-    predictor = RiskPredictor()
-    result = predictor.predict_from_vcf(
-        "sample_vcf/comprehensive_test.vcf",
-        ["Codeine"]
-    )
-    
-    json_data = json.loads(result['json_output'])
-    assessment = json_data[0]
+    # Same analysis as the VCF parsing check; reuse its result
+    result = _predict("sample_vcf/comprehensive_test.vcf", ("Codeine",))
+    assessment = result['assessments'][0]
     metrics = assessment.get('quality_metrics', {})
     
     required = ['llm_used', 'llm_provider', 'llm_model', 'llm_cached']
@@ -438,19 +482,17 @@ def check_llm_config():
 
 check("LLM configuration loaded", check_llm_config)
 
+# Template names the explainer needs (PromptTemplate values); plain strings
+# so a broken templates module fails the check below, not this script
+REQUIRED_TEMPLATES = frozenset({"variant_explanation", "risk_explanation", "dosing_adjustment"})
+
 def check_prompt_templates():
     """Check prompt templates"""
-    from src.llm_prompt_templates import PROMPT_TEMPLATES, PromptTemplate
-    
-    required_templates = [
-        PromptTemplate.VARIANT_EXPLANATION,
-        PromptTemplate.RISK_EXPLANATION,
-        PromptTemplate.DOSING_ADJUSTMENT,
-    ]
+    from src.llm_prompt_templates import PROMPT_TEMPLATES
     
-    for template in required_templates:
-        if template.value not in PROMPT_TEMPLATES:
-            raise Exception(f"Missing template: {template.value}")
+    missing = REQUIRED_TEMPLATES - PROMPT_TEMPLATES.keys()
+    if missing:
+        raise Exception(f"Missing templates: {', '.join(sorted(missing))}")
     
     print(f"       Templates loaded: {len(PROMPT_TEMPLATES)}")
 
@@ -463,36 +505,24 @@ print("\n[10/10] INTEGRATION TESTS")
 
 def check_complete_workflow():
     """Test complete workflow"""
-    from src.risk_predictor import RiskPredictor
-    import json
     from src.gene_models import Phenotype
     
-    predictor = RiskPredictor()
+    from src.risk_predictor import get_risk_predictor
+    predictor = get_risk_predictor()
     
     # Test 1: Simple genotype/phenotype
     genotypes = {"CYP2D6": ("*1", "*1")}
     phenotypes = {"CYP2D6": Phenotype.ULTRA_RAPID}
-    drug_risks = {
-        "Codeine": {
-            "drug": "Codeine",
-            "risk_level": "Toxic",
-            "explanation": "Test",
-            "dosing_recommendation": "Avoid",
-            "monitoring": "Monitor",
-            "cpic_level": "1A",
-            "strength": "Strong",
-            "clinical_guidance": "Test",
-            "reference": "Test"
-        }
-    }
-    
-    output = predictor._generate_json_output(genotypes, phenotypes, drug_risks)
-    data = json.loads(output)
+    
+    # Inspect the report entries directly; serialising them is covered by
+    # the risk prediction check
+    data = predictor._build_assessments(genotypes, phenotypes, SAMPLE_DRUG_RISKS)
     
     assert len(data) > 0, "No output"
-    assert 'llm_generated_explanation' in data[0], "No LLM explanations"
+    assert [entry.drug for entry in data] == list(SAMPLE_DRUG_RISKS), "Report entries out of order"
+    assert data[0].llm_generated_explanation, "No LLM explanations"
     
-    print(f"       JSON output: Valid")
+    print(f"       Report entries: {len(data)}")
     print(f"       LLM explanations: Generated")
     print(f"       Quality metrics: Included")
 
@@ -501,47 +531,58 @@ check("Complete workflow integration test", check_complete_workflow)
 # ============================================================================
 # SUMMARY
 # ============================================================================
-print("\n" + "="*90)
-print("VERIFICATION SUMMARY")
-print("="*90)
-
 passed = len(results["passed"])
 failed = len(results["failed"])
 warnings_count = len(results["warnings"])
 
-print(f"\n✅ PASSED: {passed}/10")
-for check_name in results["passed"]:
-    print(f"   ✓ {check_name}")
+RESULTS_FILE.write_bytes(json_dumps(results))
+
+# Assemble the summary and write it in one go
+summary = ["", "="*90, "VERIFICATION SUMMARY", "="*90, "", f"✅ PASSED: {passed}/10"]
+summary += [f"   ✓ {check_name}" for check_name in results["passed"]]
 
 if failed > 0:
-    print(f"\n❌ FAILED: {failed}")
+    summary += ["", f"❌ FAILED: {failed}"]
     for check_name, error in results["failed"]:
-        print(f"   ✗ {check_name}")
-        print(f"     {error[:80]}")
+        summary += [f"   ✗ {check_name}", f"     {error[:80]}"]
 
 if warnings_count > 0:
-    print(f"\n⚠️  WARNINGS: {warnings_count}")
-    for check_name, message in results["warnings"]:
-        print(f"   ! {check_name}: {message}")
+    summary += ["", f"⚠️  WARNINGS: {warnings_count}"]
+    summary += [f"   ! {check_name}: {message}" for check_name, message in results["warnings"]]
+
+summary.append(f"📄 Results written to {RESULTS_FILE}")
 
 # Final verdict
-print("\n" + "="*90)
+summary += ["", "="*90]
 if failed == 0:
-    print("✅ ALL SYSTEMS OPERATIONAL - READY FOR DEPLOYMENT")
-    print("\nSystem Status:")
-    print("  ✓ LLM Integration: Active (Groq API)")
-    print("  ✓ API Endpoints: All 4 operational")
-    print("  ✓ Database: Functional (Cache + Job Manager)")
-    print("  ✓ VCF Processing: Working")
-    print("  ✓ LLM Explanations: Generating")
-    print("  ✓ Quality Metrics: Tracking")
-    print("\nNext Steps:")
-    print("  1. python api.py              (start REST API server)")
-    print("  2. python test_api.py         (run API tests)")
-    print("  3. streamlit run app.py       (start web app)")
-    print("="*90)
-    sys.exit(0)
+    summary += [
+        "✅ ALL SYSTEMS OPERATIONAL - READY FOR DEPLOYMENT",
+        "",
+        "System Status:",
+        "  ✓ LLM Integration: Active (Groq API)",
+        "  ✓ API Endpoints: All 4 operational",
+        "  ✓ Database: Functional (Cache + Job Manager)",
+        "  ✓ VCF Processing: Working",
+        "  ✓ LLM Explanations: Generating",
+        "  ✓ Quality Metrics: Tracking",
+        "",
+        "Next Steps:",
+        "  1. python api.py              (start REST API server)",
+        "  2. python test_api.py         (run API tests)",
+        "  3. streamlit run app.py       (start web app)",
+    ]
 else:
-    print(f"❌ {failed} SYSTEM(S) NEED ATTENTION")
-    print("="*90)
-    sys.exit(1)
+    summary.append(f"❌ {failed} SYSTEM(S) NEED ATTENTION")
+summary.append("="*90)
+sys.stdout.write("\n".join(summary) + "\n")
+exit_code = 0 if failed == 0 else 1
+
+if os.getenv("PHARMAGUARD_FAST_EXIT"):
+    # Skip interpreter finalization (CI). atexit handlers do not run, so
+    # persist the caches' buffered explanations and flush output first
+    from src.llm_cache import flush_open_caches
+    flush_open_caches()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(exit_code)
+sys.exit(exit_code)